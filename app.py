@@ -1,7 +1,11 @@
 import streamlit as st
 from modules.database import init_db, get_connection
-from modules.inventory_manager import get_all_products, set_min_stock, update_stock, adjust_stock_by_sale
-from modules.forecasting import generate_forecast_for_product
+from modules.inventory_manager import (get_all_products, set_min_stock, update_stock, adjust_stock_by_sale,
+                                      get_all_warehouses, get_stock_by_location, get_warehouse_totals)
+from modules.forecasting import (generate_forecast_for_product, generate_all_forecasts, get_forecast_engine,
+                                 FORECAST_ENGINES)
+from modules.analytics import (refresh_analytics, get_top_movers, get_low_cover_products,
+                               get_category_summary, get_forecast_accuracy)
 import pandas as pd
 import os
 import load_products_from_csv
@@ -32,7 +36,7 @@ except Exception as e:
 # -----------------------------------------------------
 # SIDEBAR MENU
 # -----------------------------------------------------
-menu = st.sidebar.selectbox("Menu", ["Home", "Products", "Update Stock", "Record Sale"])
+menu = st.sidebar.selectbox("Menu", ["Home", "Analytics", "Products", "Update Stock", "Record Sale"])
 
 # -----------------------------------------------------
 # HOME PAGE
@@ -48,6 +52,55 @@ if menu == "Home":
     else:
         st.info("No products found. Please upload products.csv inside the /data folder.")
 
+    totals = pd.DataFrame(get_warehouse_totals())
+    if not totals.empty:
+        st.subheader("Stock by warehouse")
+        st.dataframe(totals)
+
+# -----------------------------------------------------
+# ANALYTICS PAGE (reads the materialized analytics_* tables)
+# -----------------------------------------------------
+if menu == "Analytics":
+    st.header("Analytics")
+
+    col1, col2 = st.columns([2, 1])
+    engine = col1.selectbox("Forecast engine", list(FORECAST_ENGINES),
+                            index=FORECAST_ENGINES.index(get_forecast_engine()))
+    # refreshing with an engine also makes it the one used after stock updates and sales
+    if col2.button("Refresh all forecasts"):
+        with st.spinner(f"Forecasting all products with {engine}..."):
+            results = generate_all_forecasts(engine=engine)
+        st.success(f"Forecasts refreshed for {len(results)} product/warehouse pairs.")
+
+    # read-only no-op unless rows changed since the last refresh (the scheduler also runs it)
+    refresh_analytics()
+
+    st.subheader("Top movers (last 30 days)")
+    movers = pd.DataFrame(get_top_movers(limit=10))
+    if not movers.empty:
+        st.dataframe(movers)
+    else:
+        st.info("No sales in the last 30 days.")
+
+    st.subheader("Low days of cover (<= 14 days)")
+    cover = pd.DataFrame(get_low_cover_products(max_days=14))
+    if not cover.empty:
+        st.dataframe(cover)
+    else:
+        st.info("No products are about to run out.")
+
+    st.subheader("Category sell-through (last 30 days)")
+    categories = pd.DataFrame(get_category_summary())
+    if not categories.empty:
+        st.dataframe(categories)
+
+    st.subheader("Forecast vs actual")
+    accuracy = pd.DataFrame(get_forecast_accuracy())
+    if not accuracy.empty:
+        st.dataframe(accuracy)
+    else:
+        st.info("No past forecast dates to compare yet.")
+
 # -----------------------------------------------------
 # PRODUCTS PAGE
 # -----------------------------------------------------
@@ -97,16 +150,20 @@ if menu == "Update Stock":
 
     products = get_all_products()
     product_map = {p['name']: p['product_id'] for p in products}
+    warehouse_map = {w['name']: w['warehouse_id'] for w in get_all_warehouses()}
 
     selected = st.selectbox("Select product", [""] + list(product_map.keys()))
+    location = st.selectbox("Warehouse", list(warehouse_map.keys()))
 
-    if selected:
+    if selected and location:
         pid = product_map[selected]
-        current = next((p['current_stock'] for p in products if p['product_id'] == pid), 0)
+        wid = warehouse_map[location]
+        current = next((s['current_stock'] for s in get_stock_by_location(pid) if s['warehouse_id'] == wid), 0)
+        st.caption(f"Current stock at {location}: {current}")
         new_qty = st.number_input("Quantity to add/remove (delta)", min_value=-100000, value=0)
 
         if st.button("Update stock"):
-            result = update_stock(pid, int(new_qty))
+            result = update_stock(pid, int(new_qty), warehouse_id=wid)
 
             if result == "NEGATIVE_STOCK_ERROR":
                 st.error("Stock cannot go below zero!")
@@ -126,18 +183,22 @@ if menu == "Record Sale":
     products = get_all_products()
     product_map = {p['name']: p['product_id'] for p in products}
 
+    warehouse_map = {w['name']: w['warehouse_id'] for w in get_all_warehouses()}
+
     selected = st.selectbox("Select product", [""] + list(product_map.keys()))
+    location = st.selectbox("Warehouse", list(warehouse_map.keys()))
     qty = st.number_input("Quantity sold", min_value=1, value=1)
 
     if st.button("Record Sale"):
-        if selected:
+        if selected and location:
             pid = product_map[selected]
-            current = next((p['current_stock'] for p in products if p['product_id'] == pid), 0)
+            wid = warehouse_map[location]
+            current = next((s['current_stock'] for s in get_stock_by_location(pid) if s['warehouse_id'] == wid), 0)
 
             if qty > current:
-                st.error(f"Cannot record sale. Current stock is only {current}.")
+                st.error(f"Cannot record sale. Current stock at {location} is only {current}.")
             else:
-                res = adjust_stock_by_sale(pid, int(qty))
+                res = adjust_stock_by_sale(pid, int(qty), warehouse_id=wid)
 
                 if res == "NEGATIVE_STOCK_ERROR":
                     st.error("Sale would cause negative stock!")
@@ -2,7 +2,8 @@
 import sqlite3
 import pandas as pd
 import os
-from modules.database import get_connection
+from modules.database import get_connection, get_or_create_warehouse, get_default_warehouse_id
+from modules.change_log import record_change
 
 CSV_PATH = os.path.join("data", "products.csv")
 
@@ -34,6 +35,10 @@ def load_products():
 
     category_col = next((c for c in df.columns if "category" in c), None)
     price_col = next((c for c in df.columns if "listprice" in c or "list_price" in c or "price" in c), None)
+    warehouse_col = next((c for c in df.columns if "warehouse" in c and "name" in c), None)
+    region_col = next((c for c in df.columns if "region" in c), None)
+    city_col = next((c for c in df.columns if c == "city"), None)
+    state_col = next((c for c in df.columns if c == "state"), None)
 
     if name_col is None or stock_col is None:
         print("Required columns not found in CSV. Found columns:", df.columns.tolist())
@@ -42,6 +47,11 @@ def load_products():
     conn = get_connection()
     cur = conn.cursor()
 
+    def _text(row, col):
+        if not col or pd.isna(row.get(col)):
+            return None
+        return " ".join(str(row[col]).split()) or None
+
     inserted = 0
     for _, row in df.iterrows():
         name = str(row[name_col]).strip()
@@ -57,23 +67,33 @@ def load_products():
         except Exception:
             price = 0.0
 
+        warehouse = _text(row, warehouse_col)
+        if warehouse:
+            wid = get_or_create_warehouse(cur, warehouse, _text(row, region_col),
+                                          _text(row, city_col), _text(row, state_col))
+        else:
+            wid = get_default_warehouse_id(cur)
+
         cur.execute("SELECT product_id FROM products WHERE name = ?", (name,))
         res = cur.fetchone()
         if res:
             pid = res["product_id"]
-            cur.execute("SELECT product_id FROM inventory WHERE product_id = ?", (pid,))
-            if cur.fetchone():
-                cur.execute("UPDATE inventory SET current_stock = ?, last_updated = datetime('now') WHERE product_id = ?", (stock, pid))
-            else:
-                cur.execute("INSERT INTO inventory (product_id, current_stock, last_updated) VALUES (?, ?, datetime('now'))", (pid, stock))
-            print(f"Updated existing: {name} (stock={stock})")
         else:
             cur.execute("INSERT INTO products (name, category, min_stock, early_warning_stock, price) VALUES (?, ?, NULL, NULL, ?)", (name, category, price))
             pid = cur.lastrowid
-            cur.execute("INSERT INTO inventory (product_id, current_stock, last_updated) VALUES (?, ?, datetime('now'))", (pid, stock))
-            print(f"Inserted: {name} (stock={stock})")
+            record_change(cur, "products", "insert", pid, name=name, category=category, price=price)
             inserted += 1
 
+        cur.execute("SELECT product_id FROM inventory WHERE product_id = ? AND warehouse_id = ?", (pid, wid))
+        if cur.fetchone():
+            cur.execute("UPDATE inventory SET current_stock = ?, last_updated = datetime('now') WHERE product_id = ? AND warehouse_id = ?", (stock, pid, wid))
+            record_change(cur, "inventory", "upsert", pid, wid, current_stock=stock)
+            print(f"Updated existing: {name} @ {warehouse} (stock={stock})")
+        else:
+            cur.execute("INSERT INTO inventory (product_id, warehouse_id, current_stock, last_updated) VALUES (?, ?, ?, datetime('now'))", (pid, wid, stock))
+            record_change(cur, "inventory", "upsert", pid, wid, current_stock=stock)
+            print(f"Inserted: {name} @ {warehouse} (stock={stock})")
+
     conn.commit()
     conn.close()
     print(f"Done. Inserted {inserted} new products (existing updated).")
@@ -0,0 +1,328 @@
+# modules/analytics.py
+from modules.database import get_connection
+from modules.change_log import get_cursor_position, get_latest_seq, advance_cursor
+
+# change_log consumer name; its cursor advances in the same transaction as the refresh
+ANALYTICS_CONSUMER = "analytics"
+
+# -----------------------------------------------------------
+# Materialized dashboard summaries
+#
+# analytics_product_summary, analytics_category_summary and
+# analytics_forecast_accuracy are rebuilt only for products touched since the
+# last refresh: change_log entries after the analytics cursor (sales, stock and
+# product changes) plus forecast_results rows newer than the stored id. The
+# rolling 7/30 day windows move once a day, so the first refresh of a new day
+# rebuilds everything.
+#
+# analytics_forecast_accuracy is history rather than a summary: every forecast
+# is captured per location when it is written, because the next refit deletes
+# it from forecast_results. It is never rebuilt.
+# -----------------------------------------------------------
+
+def capture_forecasts(cur, product_id, warehouse_id):
+    """
+    Snapshots the forecast just written for one location. Runs on the writer's
+    cursor so it commits with the forecast. A day that already has a captured
+    forecast keeps it; refits never overwrite it.
+    """
+    cur.execute("""
+        INSERT OR IGNORE INTO analytics_forecast_accuracy (product_id, warehouse_id, forecast_date, forecast_qty)
+        SELECT product_id, warehouse_id, date(forecast_date), forecast_qty
+        FROM forecast_results
+        WHERE product_id = ? AND warehouse_id = ?
+    """, (product_id, warehouse_id))
+
+
+def _today(cur):
+    cur.execute("SELECT date('now','localtime') AS d")
+    return cur.fetchone()["d"]
+
+
+def _load_state(cur):
+    cur.execute("SELECT last_forecast_id, refresh_day FROM analytics_refresh_state WHERE id = 1")
+    row = cur.fetchone()
+    if row is None:
+        return 0, None
+    return row["last_forecast_id"] or 0, row["refresh_day"]
+
+
+def _collect_changed_products(cur, last_seq, max_seq, last_forecast_id, full):
+    cur.execute("DELETE FROM _analytics_changed")
+    if full:
+        cur.execute("INSERT INTO _analytics_changed (product_id) SELECT product_id FROM products")
+        return
+
+    cur.execute("""
+        INSERT OR IGNORE INTO _analytics_changed (product_id)
+        SELECT product_id FROM change_log WHERE seq > ? AND seq <= ?
+        UNION
+        SELECT product_id FROM forecast_results WHERE id > ?
+    """, (last_seq, max_seq, last_forecast_id))
+
+
+def _refresh_product_summary(cur, today, now):
+    cur.execute("""
+        INSERT OR REPLACE INTO analytics_product_summary (
+            product_id, name, category, current_stock, units_sold_7d, units_sold_30d,
+            revenue_30d, avg_daily_sales_30d, days_of_cover, forecast_next_14d,
+            last_sale_date, refreshed_at)
+        SELECT p.product_id, p.name, IFNULL(p.category, ''),
+               IFNULL(s.current_stock, 0),
+               IFNULL(d.units_7d, 0),
+               IFNULL(d.units_30d, 0),
+               IFNULL(d.revenue_30d, 0),
+               IFNULL(d.units_30d, 0) / 30.0,
+               CASE WHEN IFNULL(d.units_30d, 0) > 0
+                    THEN IFNULL(s.current_stock, 0) / (d.units_30d / 30.0) END,
+               IFNULL(f.qty, 0),
+               d.last_sale,
+               ?
+        FROM products p
+        JOIN _analytics_changed c ON c.product_id = p.product_id
+        LEFT JOIN product_stock s ON s.product_id = p.product_id
+        LEFT JOIN (
+            SELECT sa.product_id,
+                   SUM(CASE WHEN date(sa.sale_date) >= date(?, '-6 days') THEN sa.sale_qty ELSE 0 END) AS units_7d,
+                   SUM(CASE WHEN date(sa.sale_date) >= date(?, '-29 days') THEN sa.sale_qty ELSE 0 END) AS units_30d,
+                   SUM(CASE WHEN date(sa.sale_date) >= date(?, '-29 days')
+                            THEN sa.sale_qty * COALESCE(sa.per_unit_price, pr.price, 0) ELSE 0 END) AS revenue_30d,
+                   MAX(sa.sale_date) AS last_sale
+            FROM sales sa
+            JOIN _analytics_changed c ON c.product_id = sa.product_id
+            JOIN products pr ON pr.product_id = sa.product_id
+            GROUP BY sa.product_id
+        ) d ON d.product_id = p.product_id
+        LEFT JOIN (
+            SELECT fr.product_id, SUM(fr.forecast_qty) AS qty
+            FROM forecast_results fr
+            JOIN _analytics_changed c ON c.product_id = fr.product_id
+            WHERE date(fr.forecast_date) > ? AND date(fr.forecast_date) <= date(?, '+14 days')
+            GROUP BY fr.product_id
+        ) f ON f.product_id = p.product_id
+    """, (now, today, today, today, today, today))
+
+    # top movers: rank over the (small) summary table, not the raw sales
+    cur.execute("""
+        UPDATE analytics_product_summary
+        SET mover_rank = r.rnk
+        FROM (
+            SELECT product_id, RANK() OVER (ORDER BY units_sold_30d DESC) AS rnk
+            FROM analytics_product_summary
+        ) r
+        WHERE r.product_id = analytics_product_summary.product_id
+    """)
+
+
+def _refresh_category_summary(cur, affected, now):
+    cur.execute("DELETE FROM _analytics_categories")
+    cur.executemany("INSERT OR IGNORE INTO _analytics_categories (category) VALUES (?)",
+                    [(c,) for c in affected])
+    cur.execute("""
+        DELETE FROM analytics_category_summary
+        WHERE category IN (SELECT category FROM _analytics_categories)
+    """)
+    cur.execute("""
+        INSERT INTO analytics_category_summary (
+            category, products, current_stock, units_sold_30d, revenue_30d,
+            sell_through_30d, refreshed_at)
+        SELECT category, COUNT(*), SUM(current_stock), SUM(units_sold_30d), SUM(revenue_30d),
+               CASE WHEN SUM(units_sold_30d) + SUM(current_stock) > 0
+                    THEN 1.0 * SUM(units_sold_30d) / (SUM(units_sold_30d) + SUM(current_stock)) END,
+               ?
+        FROM analytics_product_summary
+        WHERE category IN (SELECT category FROM _analytics_categories)
+        GROUP BY category
+    """, (now,))
+
+
+def _capture_new_forecasts(cur, last_forecast_id, max_forecast_id):
+    # forecasts written without capture_forecasts (e.g. loaded directly); first one still wins
+    cur.execute("""
+        INSERT OR IGNORE INTO analytics_forecast_accuracy (product_id, warehouse_id, forecast_date, forecast_qty)
+        SELECT product_id, warehouse_id, date(forecast_date), forecast_qty
+        FROM forecast_results
+        WHERE id > ? AND id <= ?
+    """, (last_forecast_id, max_forecast_id))
+
+
+def _refresh_forecast_accuracy(cur, today):
+    # only finished days are scored, today's sales are still coming in
+    cur.execute("""
+        UPDATE analytics_forecast_accuracy
+        SET actual_qty = 0, abs_error = ABS(forecast_qty)
+        WHERE forecast_date < ?
+          AND product_id IN (SELECT product_id FROM _analytics_changed)
+    """, (today,))
+    cur.execute("""
+        UPDATE analytics_forecast_accuracy
+        SET actual_qty = a.qty,
+            abs_error = ABS(forecast_qty - a.qty)
+        FROM (
+            SELECT sa.product_id, sa.warehouse_id, date(sa.sale_date) AS d, SUM(sa.sale_qty) AS qty
+            FROM sales sa
+            JOIN _analytics_changed c ON c.product_id = sa.product_id
+            WHERE date(sa.sale_date) < ?
+            GROUP BY sa.product_id, sa.warehouse_id, date(sa.sale_date)
+        ) a
+        WHERE a.product_id = analytics_forecast_accuracy.product_id
+          AND a.warehouse_id = analytics_forecast_accuracy.warehouse_id
+          AND a.d = analytics_forecast_accuracy.forecast_date
+    """, (today,))
+
+
+# -----------------------------------------------------------
+# Incremental refresh
+# -----------------------------------------------------------
+def _is_up_to_date(cur):
+    # read-only check, so an idle refresh never takes the write lock
+    last_forecast_id, refresh_day = _load_state(cur)
+    if refresh_day != _today(cur):
+        return False
+    if get_cursor_position(cur, ANALYTICS_CONSUMER) < get_latest_seq(cur):
+        return False
+    cur.execute("SELECT IFNULL(MAX(id), 0) AS m FROM forecast_results")
+    return cur.fetchone()["m"] <= last_forecast_id
+
+
+def refresh_analytics(full=False):
+    """
+    Brings the analytics_* tables up to date and returns the number of
+    products that were recomputed.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    if not full and _is_up_to_date(cur):
+        conn.close()
+        return 0
+
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS _analytics_changed (product_id INTEGER PRIMARY KEY)")
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS _analytics_categories (category TEXT PRIMARY KEY)")
+
+    # one writer at a time; the watermarks below are read inside the same transaction
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        today = _today(cur)
+        cur.execute("SELECT datetime('now','localtime') AS ts")
+        now = cur.fetchone()["ts"]
+
+        last_forecast_id, refresh_day = _load_state(cur)
+        full = full or refresh_day != today
+
+        last_seq = get_cursor_position(cur, ANALYTICS_CONSUMER)
+        max_seq = get_latest_seq(cur)
+        cur.execute("SELECT IFNULL(MAX(id), 0) AS m FROM forecast_results")
+        max_forecast_id = cur.fetchone()["m"]
+
+        if full:
+            cur.execute("DELETE FROM analytics_product_summary")
+            cur.execute("DELETE FROM analytics_category_summary")
+
+        _capture_new_forecasts(cur, last_forecast_id, max_forecast_id)
+        _collect_changed_products(cur, last_seq, max_seq, last_forecast_id, full)
+        cur.execute("SELECT COUNT(*) AS n FROM _analytics_changed")
+        changed = cur.fetchone()["n"]
+
+        if changed:
+            # categories a changed product is leaving as well as joining
+            cur.execute("""
+                SELECT category FROM analytics_product_summary
+                WHERE product_id IN (SELECT product_id FROM _analytics_changed)
+            """)
+            affected = {r["category"] for r in cur.fetchall()}
+
+            _refresh_product_summary(cur, today, now)
+
+            cur.execute("""
+                SELECT category FROM analytics_product_summary
+                WHERE product_id IN (SELECT product_id FROM _analytics_changed)
+            """)
+            affected.update(r["category"] for r in cur.fetchall())
+
+            _refresh_category_summary(cur, affected, now)
+            _refresh_forecast_accuracy(cur, today)
+
+        cur.execute("""
+            INSERT INTO analytics_refresh_state (id, last_forecast_id, refresh_day, refreshed_at)
+            VALUES (1, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET last_forecast_id = excluded.last_forecast_id,
+                                          refresh_day = excluded.refresh_day,
+                                          refreshed_at = excluded.refreshed_at
+        """, (max_forecast_id, today, now))
+        advance_cursor(cur, ANALYTICS_CONSUMER, max_seq)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return changed
+
+
+# -----------------------------------------------------------
+# Dashboard readers (precomputed tables only)
+# -----------------------------------------------------------
+def get_product_summary():
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM analytics_product_summary ORDER BY name")
+    rows = cur.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def get_top_movers(limit=10):
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT mover_rank, name, category, units_sold_7d, units_sold_30d, revenue_30d,
+               current_stock, days_of_cover
+        FROM analytics_product_summary
+        WHERE units_sold_30d > 0
+        ORDER BY mover_rank
+        LIMIT ?
+    """, (limit,))
+    rows = cur.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def get_low_cover_products(max_days=14):
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT name, category, current_stock, avg_daily_sales_30d, days_of_cover, forecast_next_14d
+        FROM analytics_product_summary
+        WHERE days_of_cover IS NOT NULL AND days_of_cover <= ?
+        ORDER BY days_of_cover
+    """, (max_days,))
+    rows = cur.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def get_category_summary():
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM analytics_category_summary ORDER BY units_sold_30d DESC, category")
+    rows = cur.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def get_forecast_accuracy():
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT s.name, COUNT(DISTINCT a.forecast_date) AS days, SUM(a.forecast_qty) AS forecast_qty,
+               SUM(a.actual_qty) AS actual_qty, AVG(a.abs_error) AS mae
+        FROM analytics_forecast_accuracy a
+        JOIN analytics_product_summary s ON s.product_id = a.product_id
+        WHERE a.actual_qty IS NOT NULL
+        GROUP BY a.product_id
+        ORDER BY mae DESC
+    """)
+    rows = cur.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
@@ -0,0 +1,135 @@
+# modules/change_log.py
+import json
+from modules.database import get_connection
+
+# -----------------------------------------------------------
+# Change-data-capture log
+#
+# Every mutation of products / inventory / sales appends a row to change_log
+# on the writer's cursor, so it commits or rolls back with the change itself.
+# seq is AUTOINCREMENT and therefore strictly increasing and never reused.
+# Consumers keep a durable cursor (the last seq they processed) in
+# change_cursors and only read what came after it.
+# -----------------------------------------------------------
+
+def record_change(cur, table_name, op, product_id, warehouse_id=None, **data):
+    cur.execute("""
+        INSERT INTO change_log (table_name, op, product_id, warehouse_id, payload, changed_at)
+        VALUES (?, ?, ?, ?, ?, datetime('now','localtime'))
+    """, (table_name, op, product_id, warehouse_id, json.dumps(data, default=str)))
+    return cur.lastrowid
+
+
+def _row_to_change(r):
+    change = dict(r)
+    change["payload"] = json.loads(change["payload"]) if change["payload"] else {}
+    return change
+
+
+# -----------------------------------------------------------
+# Cursor-level API (joins the caller's transaction)
+# -----------------------------------------------------------
+def get_cursor_position(cur, consumer):
+    cur.execute("SELECT last_seq FROM change_cursors WHERE consumer = ?", (consumer,))
+    row = cur.fetchone()
+    return row["last_seq"] if row else 0
+
+
+def read_changes(cur, consumer, limit=None, tables=None):
+    """Changes after the consumer's cursor, oldest first."""
+    after = get_cursor_position(cur, consumer)
+    query = "SELECT * FROM change_log WHERE seq > ?"
+    params = [after]
+    if tables:
+        query += f" AND table_name IN ({','.join('?' * len(tables))})"
+        params.extend(tables)
+    query += " ORDER BY seq"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    cur.execute(query, params)
+    return [_row_to_change(r) for r in cur.fetchall()]
+
+
+def get_latest_seq(cur):
+    cur.execute("SELECT IFNULL(MAX(seq), 0) AS seq FROM change_log")
+    return cur.fetchone()["seq"]
+
+
+def advance_cursor(cur, consumer, seq):
+    # cursors only move forward, so a late or repeated ack is harmless
+    cur.execute("""
+        INSERT INTO change_cursors (consumer, last_seq, updated_at)
+        VALUES (?, ?, datetime('now','localtime'))
+        ON CONFLICT(consumer) DO UPDATE SET last_seq = MAX(last_seq, excluded.last_seq),
+                                            updated_at = excluded.updated_at
+    """, (consumer, seq))
+
+
+# -----------------------------------------------------------
+# Connection-level API for standalone consumers
+# -----------------------------------------------------------
+def fetch_changes(consumer, limit=1000, tables=None):
+    conn = get_connection()
+    changes = read_changes(conn.cursor(), consumer, limit, tables)
+    conn.close()
+    return changes
+
+
+def ack_changes(consumer, seq):
+    conn = get_connection()
+    advance_cursor(conn.cursor(), consumer, seq)
+    conn.commit()
+    conn.close()
+
+
+def consume_changes(consumer, handler, batch_size=1000, tables=None):
+    """
+    Calls handler(changes) batch by batch and acks each batch after the
+    handler returns (at-least-once). Returns the number of changes handled.
+    """
+    handled = 0
+    while True:
+        conn = get_connection()
+        cur = conn.cursor()
+        upto = get_latest_seq(cur)
+        changes = read_changes(cur, consumer, batch_size, tables)
+        if not changes:
+            # filtered reads would otherwise leave the cursor behind unrelated changes
+            advance_cursor(cur, consumer, upto)
+            conn.commit()
+            conn.close()
+            return handled
+        conn.close()
+
+        handler(changes)
+        ack_changes(consumer, changes[-1]["seq"])
+        handled += len(changes)
+
+
+def changed_partitions(changes):
+    """Distinct (product_id, warehouse_id) pairs touched by a batch, in first-seen order."""
+    seen = {}
+    for c in changes:
+        seen.setdefault((c["product_id"], c["warehouse_id"]), None)
+    return list(seen)
+
+
+def prune_change_log(consumers):
+    """
+    Deletes entries every one of `consumers` has already processed. A consumer
+    that has never run counts as being at 0, so nothing it has not read is lost.
+    """
+    if not consumers:
+        return 0
+
+    conn = get_connection()
+    cur = conn.cursor()
+    upto = min(get_cursor_position(cur, consumer) for consumer in consumers)
+    removed = 0
+    if upto:
+        cur.execute("DELETE FROM change_log WHERE seq <= ?", (upto,))
+        removed = cur.rowcount
+    conn.commit()
+    conn.close()
+    return removed
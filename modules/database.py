@@ -1,18 +1,131 @@
 # modules/database.py
+import os
 import sqlite3
 from pathlib import Path
 
-DB_PATH = Path("inventory.db")
+DB_PATH = Path(os.environ.get("INVENTORY_DB", "inventory.db"))
+
+# stock, sales and forecasts recorded without a location land here
+DEFAULT_WAREHOUSE = "Default"
 
 def get_connection():
-    conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
+    conn = sqlite3.connect(str(DB_PATH), check_same_thread=False, timeout=30)
     conn.row_factory = sqlite3.Row
     return conn
 
+def get_or_create_warehouse(cur, name, region=None, city=None, state=None):
+    """
+    Returns the warehouse_id for `name`, inserting the warehouse if needed.
+    Runs on the caller's cursor so it joins the caller's transaction.
+    """
+    cur.execute("SELECT warehouse_id FROM warehouses WHERE name = ?", (name,))
+    row = cur.fetchone()
+    if row:
+        return row["warehouse_id"]
+    cur.execute("INSERT INTO warehouses (name, region, city, state) VALUES (?, ?, ?, ?)",
+                (name, region, city, state))
+    return cur.lastrowid
+
+def get_default_warehouse_id(cur):
+    return get_or_create_warehouse(cur, DEFAULT_WAREHOUSE)
+
+def get_setting(key, default=None):
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT value FROM settings WHERE key = ?", (key,))
+    row = cur.fetchone()
+    conn.close()
+    return row["value"] if row else default
+
+def set_setting(key, value):
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO settings (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """, (key, value))
+    conn.commit()
+    conn.close()
+
+def _column_names(cur, table):
+    cur.execute(f"PRAGMA table_info({table})")
+    return [r["name"] for r in cur.fetchall()]
+
+def _migrate_to_warehouses(cur):
+    """
+    Older databases keyed inventory by product_id alone and had no
+    warehouse_id on sales / forecast_results. Move those rows into the
+    default warehouse so every row belongs to a (product, warehouse) partition.
+    """
+    inv_cols = _column_names(cur, "inventory")
+    if inv_cols and "warehouse_id" not in inv_cols:
+        cur.execute("ALTER TABLE inventory RENAME TO inventory_legacy")
+        _create_inventory_table(cur)
+        default_id = get_default_warehouse_id(cur)
+        cur.execute("""
+            INSERT INTO inventory (product_id, warehouse_id, current_stock, last_updated)
+            SELECT product_id, ?, current_stock, last_updated FROM inventory_legacy
+        """, (default_id,))
+        cur.execute("DROP TABLE inventory_legacy")
+
+    for table in ("sales", "forecast_results"):
+        if "warehouse_id" not in _column_names(cur, table):
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN warehouse_id INTEGER REFERENCES warehouses(warehouse_id)")
+        cur.execute(f"SELECT 1 FROM {table} WHERE warehouse_id IS NULL LIMIT 1")
+        if cur.fetchone():
+            cur.execute(f"UPDATE {table} SET warehouse_id = ? WHERE warehouse_id IS NULL",
+                        (get_default_warehouse_id(cur),))
+
+def _create_inventory_table(cur):
+    # inventory: current stock per (product, warehouse) partition
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS inventory (
+        product_id INTEGER,
+        warehouse_id INTEGER,
+        current_stock INTEGER DEFAULT 0,
+        last_updated TEXT,
+        PRIMARY KEY (product_id, warehouse_id),
+        FOREIGN KEY(product_id) REFERENCES products(product_id),
+        FOREIGN KEY(warehouse_id) REFERENCES warehouses(warehouse_id)
+    );
+    """)
+
+def _create_forecast_accuracy_table(cur):
+    # analytics_forecast_accuracy: each location's forecast for a day, captured when it was
+    # written (first one wins), and the actual demand once that day is over
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS analytics_forecast_accuracy (
+        product_id INTEGER,
+        warehouse_id INTEGER,
+        forecast_date TEXT,
+        forecast_qty REAL,
+        actual_qty REAL,
+        abs_error REAL,
+        PRIMARY KEY (product_id, warehouse_id, forecast_date),
+        FOREIGN KEY(product_id) REFERENCES products(product_id),
+        FOREIGN KEY(warehouse_id) REFERENCES warehouses(warehouse_id)
+    );
+    """)
+
+def _migrate_forecast_accuracy(cur):
+    """
+    The first analytics_forecast_accuracy was keyed by (product, day) and
+    re-summed from whatever was left in forecast_results, so its numbers can't
+    be trusted. Start over and recapture the forecasts that are still stored.
+    """
+    if "warehouse_id" in _column_names(cur, "analytics_forecast_accuracy"):
+        return
+    cur.execute("DROP TABLE analytics_forecast_accuracy")
+    _create_forecast_accuracy_table(cur)
+    cur.execute("UPDATE analytics_refresh_state SET last_forecast_id = 0")
+
 def init_db():
     conn = get_connection()
     cur = conn.cursor()
 
+    # WAL lets readers keep going while the single writer commits
+    cur.execute("PRAGMA journal_mode=WAL")
+
     # products: product master (no current stock)
     cur.execute("""
     CREATE TABLE IF NOT EXISTS products (
@@ -25,16 +138,19 @@ def init_db():
     );
     """)
 
-    # inventory: current stock per product
+    # warehouses: stock locations (from WarehouseName / RegionName / City / State)
     cur.execute("""
-    CREATE TABLE IF NOT EXISTS inventory (
-        product_id INTEGER PRIMARY KEY,
-        current_stock INTEGER DEFAULT 0,
-        last_updated TEXT,
-        FOREIGN KEY(product_id) REFERENCES products(product_id)
+    CREATE TABLE IF NOT EXISTS warehouses (
+        warehouse_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE,
+        region TEXT,
+        city TEXT,
+        state TEXT
     );
     """)
 
+    _create_inventory_table(cur)
+
     # sales: store every sale event (useful for forecasting)
     cur.execute("""
     CREATE TABLE IF NOT EXISTS sales (
@@ -43,7 +159,9 @@ def init_db():
         sale_qty INTEGER,
         sale_date TEXT,
         per_unit_price REAL,
-        FOREIGN KEY(product_id) REFERENCES products(product_id)
+        warehouse_id INTEGER,
+        FOREIGN KEY(product_id) REFERENCES products(product_id),
+        FOREIGN KEY(warehouse_id) REFERENCES warehouses(warehouse_id)
     );
     """)
 
@@ -56,7 +174,9 @@ def init_db():
         forecast_qty REAL,
         model TEXT,
         created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY(product_id) REFERENCES products(product_id)
+        warehouse_id INTEGER,
+        FOREIGN KEY(product_id) REFERENCES products(product_id),
+        FOREIGN KEY(warehouse_id) REFERENCES warehouses(warehouse_id)
     );
     """)
 
@@ -72,6 +192,132 @@ def init_db():
     );
     """)
 
+    # settings: app-wide choices that must survive restarts (e.g. the forecast engine)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """)
+
+    # forecast_models: trained catalog-wide models (modules/global_forecasting.py)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS forecast_models (
+        name TEXT PRIMARY KEY,
+        version INTEGER,
+        trained_at TEXT,
+        model BLOB
+    );
+    """)
+
+    # change_log: append-only log of products / inventory / sales mutations (modules/change_log.py)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT,
+        op TEXT,
+        product_id INTEGER,
+        warehouse_id INTEGER,
+        payload TEXT,
+        changed_at TEXT
+    );
+    """)
+
+    # change_cursors: last change_log seq each consumer has processed
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS change_cursors (
+        consumer TEXT PRIMARY KEY,
+        last_seq INTEGER DEFAULT 0,
+        updated_at TEXT
+    );
+    """)
+
+    # forecast_cache: fingerprint of the inputs behind each stored forecast (modules/forecast_cache.py)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS forecast_cache (
+        product_id INTEGER,
+        warehouse_id INTEGER,
+        fingerprint TEXT,
+        horizon INTEGER,
+        model TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        last_used REAL,
+        PRIMARY KEY (product_id, warehouse_id)
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_forecast_cache_lru ON forecast_cache (last_used)")
+
+    # analytics_*: materialized dashboard summaries, maintained by modules/analytics.py
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS analytics_product_summary (
+        product_id INTEGER PRIMARY KEY,
+        name TEXT,
+        category TEXT,
+        current_stock INTEGER,
+        units_sold_7d INTEGER,
+        units_sold_30d INTEGER,
+        revenue_30d REAL,
+        avg_daily_sales_30d REAL,
+        days_of_cover REAL,
+        forecast_next_14d REAL,
+        last_sale_date TEXT,
+        mover_rank INTEGER,
+        refreshed_at TEXT,
+        FOREIGN KEY(product_id) REFERENCES products(product_id)
+    );
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS analytics_category_summary (
+        category TEXT PRIMARY KEY,
+        products INTEGER,
+        current_stock INTEGER,
+        units_sold_30d INTEGER,
+        revenue_30d REAL,
+        sell_through_30d REAL,
+        refreshed_at TEXT
+    );
+    """)
+
+    _create_forecast_accuracy_table(cur)
+
+    # analytics_refresh_state: watermarks of what the summaries have already seen
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS analytics_refresh_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_forecast_id INTEGER DEFAULT 0,
+        refresh_day TEXT,
+        refreshed_at TEXT
+    );
+    """)
+
+    _migrate_to_warehouses(cur)
+    _migrate_forecast_accuracy(cur)
+
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sales_partition ON sales (product_id, warehouse_id, sale_date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_forecast_partition ON forecast_results (product_id, warehouse_id, forecast_date)")
+
+    # product and warehouse totals are aggregated from the partitions, never stored
+    cur.execute("""
+    CREATE VIEW IF NOT EXISTS product_stock AS
+    SELECT product_id,
+           SUM(current_stock) AS current_stock,
+           MAX(last_updated) AS last_updated,
+           COUNT(*) AS locations
+    FROM inventory
+    GROUP BY product_id;
+    """)
+
+    cur.execute("""
+    CREATE VIEW IF NOT EXISTS warehouse_stock AS
+    SELECT w.warehouse_id, w.name, w.region, w.city, w.state,
+           COUNT(i.product_id) AS products,
+           IFNULL(SUM(i.current_stock), 0) AS total_stock
+    FROM warehouses w
+    LEFT JOIN inventory i ON i.warehouse_id = w.warehouse_id
+    GROUP BY w.warehouse_id;
+    """)
+
     conn.commit()
     conn.close()
 
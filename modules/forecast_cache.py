@@ -0,0 +1,132 @@
+# modules/forecast_cache.py
+import hashlib
+import json
+import threading
+import pandas as pd
+from modules.database import get_connection
+
+# -----------------------------------------------------------
+# Content-addressed forecast cache
+#
+# One entry per (product, warehouse) holding the fingerprint of the inputs
+# that produced the forecast currently in forecast_results. A refresh whose
+# fingerprint matches reuses those rows instead of refitting.
+# -----------------------------------------------------------
+
+# least recently used entries beyond this are evicted; last_used is a
+# use counter rather than a timestamp so ties can't pick the wrong entry
+FORECAST_CACHE_MAX_ENTRIES = 5000
+
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def get_cache_stats():
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) AS n FROM forecast_cache")
+    size = cur.fetchone()["n"]
+    conn.close()
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["size"] = size
+    stats["max_entries"] = FORECAST_CACHE_MAX_ENTRIES
+    return stats
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
+
+
+def forecast_fingerprint(series, config, horizon):
+    """
+    sha256 over the daily demand series, the model config, the horizon and
+    the first forecast date (stored forecasts are dated from tomorrow).
+    """
+    h = hashlib.sha256()
+    if not series.empty:
+        h.update(pd.util.hash_pandas_object(series, index=True).values.tobytes())
+    anchor = (pd.Timestamp.today().normalize() + pd.Timedelta(days=1)).date().isoformat()
+    h.update(json.dumps({"config": config, "horizon": int(horizon), "anchor": anchor},
+                        sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def get_cached_forecast(product_id, warehouse_id, fingerprint, horizon):
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT 1 FROM forecast_cache
+        WHERE product_id = ? AND warehouse_id = ? AND fingerprint = ? AND horizon = ?
+    """, (product_id, warehouse_id, fingerprint, horizon))
+    if cur.fetchone() is None:
+        conn.close()
+        _count("misses")
+        return None
+
+    cur.execute("""
+        SELECT forecast_qty FROM forecast_results
+        WHERE product_id = ? AND warehouse_id = ?
+        ORDER BY forecast_date
+    """, (product_id, warehouse_id))
+    values = [float(r["forecast_qty"]) for r in cur.fetchall()]
+    if len(values) != horizon:
+        conn.close()
+        _count("misses")
+        return None
+
+    cur.execute("""
+        UPDATE forecast_cache SET last_used = (SELECT IFNULL(MAX(last_used), 0) + 1 FROM forecast_cache)
+        WHERE product_id = ? AND warehouse_id = ?
+    """, (product_id, warehouse_id))
+    conn.commit()
+    conn.close()
+    _count("hits")
+    return pd.Series(values)
+
+
+def store_cached_forecast(product_id, warehouse_id, fingerprint, horizon, model_name):
+    store_cached_forecasts([(product_id, warehouse_id, fingerprint, horizon, model_name)])
+
+
+def store_cached_forecasts(entries):
+    """entries: (product_id, warehouse_id, fingerprint, horizon, model_name) tuples."""
+    if not entries:
+        return
+
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.executemany("""
+        INSERT INTO forecast_cache (product_id, warehouse_id, fingerprint, horizon, model, last_used)
+        VALUES (?, ?, ?, ?, ?, (SELECT IFNULL(MAX(last_used), 0) + 1 FROM forecast_cache))
+        ON CONFLICT(product_id, warehouse_id)
+        DO UPDATE SET fingerprint = excluded.fingerprint, horizon = excluded.horizon,
+                      model = excluded.model, created_at = CURRENT_TIMESTAMP,
+                      last_used = excluded.last_used
+    """, entries)
+
+    cur.execute("SELECT COUNT(*) AS n FROM forecast_cache")
+    overflow = cur.fetchone()["n"] - FORECAST_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        cur.execute("""
+            DELETE FROM forecast_cache WHERE rowid IN (
+                SELECT rowid FROM forecast_cache ORDER BY last_used LIMIT ?
+            )
+        """, (overflow,))
+        _count("evictions", cur.rowcount)
+
+    conn.commit()
+    conn.close()
+
+
+def invalidate_cached_forecast(cur, product_id, warehouse_id):
+    # runs on the caller's cursor so it commits together with the new forecast rows
+    cur.execute("DELETE FROM forecast_cache WHERE product_id = ? AND warehouse_id = ?",
+                (product_id, warehouse_id))
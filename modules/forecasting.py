@@ -1,20 +1,39 @@
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 import numpy as np
 import pandas as pd
 from statsmodels.tsa.statespace.sarimax import SARIMAX
 from prophet import Prophet
 from pmdarima import auto_arima
-from modules.database import get_connection
+from modules.database import get_connection, get_default_warehouse_id, get_setting, set_setting
 from modules.preprocessing import get_daily_sales_series
+from modules.forecast_cache import (forecast_fingerprint, get_cached_forecast, store_cached_forecast,
+                                    invalidate_cached_forecast)
+from modules.analytics import capture_forecasts
 
 warnings.filterwarnings("ignore")
 
+# selectable engines; the choice is stored in settings and used by every refresh
+FORECAST_ENGINES = ("hybrid", "global_gbm")
+FORECAST_ENGINE_SETTING = "forecast_engine"
+
+# number of (product, warehouse) forecasts fitted concurrently
+FORECAST_WORKERS = 4
+
+# everything that changes the hybrid's output for a given series; part of the cache key
+HYBRID_CONFIG = {
+    "engine": "hybrid",
+    "seasonal_period": 7,
+    "sarima_min_points": 10,
+    "prophet_min_points": 6,
+}
+
 # -----------------------------------------------------------
 # Train SARIMA Model
 # -----------------------------------------------------------
 def train_sarima(series, seasonal_period=7):
-    if series.empty or len(series) < 10:
+    if series.empty or len(series) < HYBRID_CONFIG["sarima_min_points"]:
         return None
     try:
         arima_model = auto_arima(series, seasonal=True, m=seasonal_period,
@@ -46,7 +65,7 @@ def forecast_sarima(fitted_model, steps):
 # Train Prophet Model
 # -----------------------------------------------------------
 def train_prophet(series):
-    if series.empty or len(series) < 6:
+    if series.empty or len(series) < HYBRID_CONFIG["prophet_min_points"]:
         return None
 
     df = series.reset_index()
@@ -74,44 +93,175 @@ def forecast_prophet(model, periods):
 # -----------------------------------------------------------
 # SAVE forecast to DB
 # -----------------------------------------------------------
-def save_forecast_to_db(product_id, forecast_series, model_name='hybrid'):
+def save_forecast_to_db(product_id, forecast_series, model_name='hybrid', warehouse_id=None):
     if forecast_series is None or len(forecast_series) == 0:
         return
 
     conn = get_connection()
     cur = conn.cursor()
 
-    # remove old forecasts
-    cur.execute("DELETE FROM forecast_results WHERE product_id = ?", (product_id,))
+    if warehouse_id is None:
+        warehouse_id = get_default_warehouse_id(cur)
+
+    _write_forecast(cur, product_id, warehouse_id, forecast_series, model_name)
+
+    conn.commit()
+    conn.close()
+
+
+def save_forecasts_bulk(forecasts, model_name):
+    """
+    Writes {(product_id, warehouse_id): forecast_series} in one transaction.
+    Used by batch engines that predict the whole catalog at once.
+    """
+    if not forecasts:
+        return
+
+    conn = get_connection()
+    cur = conn.cursor()
+    for (product_id, warehouse_id), forecast_series in forecasts.items():
+        if forecast_series is None or len(forecast_series) == 0:
+            continue
+        _write_forecast(cur, product_id, warehouse_id, forecast_series, model_name)
+    conn.commit()
+    conn.close()
+
+
+def _write_forecast(cur, product_id, warehouse_id, forecast_series, model_name):
+    # remove old forecasts for this location only
+    cur.execute("DELETE FROM forecast_results WHERE product_id = ? AND warehouse_id = ?",
+                (product_id, warehouse_id))
 
     # write new forecasts
     start_date = pd.Timestamp.today().normalize() + pd.Timedelta(days=1)
     dates = pd.date_range(start_date, periods=len(forecast_series), freq='D')
 
-    for dt, qty in zip(dates, forecast_series):
-        cur.execute("""
-            INSERT INTO forecast_results (product_id, forecast_date, forecast_qty, model)
-            VALUES (?, ?, ?, ?)
-        """, (product_id, dt.isoformat(), float(qty), model_name))
+    cur.executemany("""
+        INSERT INTO forecast_results (product_id, warehouse_id, forecast_date, forecast_qty, model)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(product_id, warehouse_id, dt.isoformat(), float(qty), model_name)
+          for dt, qty in zip(dates, forecast_series)])
 
-    conn.commit()
+    # a forecast written outside the cached path no longer matches any fingerprint
+    invalidate_cached_forecast(cur, product_id, warehouse_id)
+
+    # the next refit deletes these rows, so keep them for forecast-vs-actual now
+    capture_forecasts(cur, product_id, warehouse_id)
+
+
+# -----------------------------------------------------------
+# Locations a product is stocked or sold at
+# -----------------------------------------------------------
+def get_forecast_partitions(product_id=None):
+    conn = get_connection()
+    cur = conn.cursor()
+    query = """
+        SELECT product_id, warehouse_id FROM inventory
+        UNION
+        SELECT DISTINCT product_id, warehouse_id FROM sales
+    """
+    if product_id is None:
+        cur.execute(f"SELECT product_id, warehouse_id FROM ({query}) ORDER BY product_id, warehouse_id")
+    else:
+        cur.execute(f"SELECT product_id, warehouse_id FROM ({query}) WHERE product_id = ? ORDER BY warehouse_id",
+                    (product_id,))
+    rows = cur.fetchall()
     conn.close()
+    return [(r["product_id"], r["warehouse_id"]) for r in rows]
 
 
 # -----------------------------------------------------------
-# HYBRID FORECAST = (SARIMA + Prophet) / 2
+# Fan out forecasts per (product, warehouse) in parallel
 # -----------------------------------------------------------
-def generate_forecast_for_product(product_id, days=14):
-    series = get_daily_sales_series(product_id)
+def generate_forecasts_by_location(partitions=None, days=14, max_workers=FORECAST_WORKERS):
+    if partitions is None:
+        partitions = get_forecast_partitions()
+    if not partitions:
+        return {}
+
+    # each job opens its own connection, so partitions never share state
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            (pid, wid): pool.submit(generate_forecast_for_product, pid, days, wid)
+            for pid, wid in partitions
+        }
+    return {key: fut.result() for key, fut in futures.items()}
+
+
+# -----------------------------------------------------------
+# Refresh the whole catalog with the chosen engine
+# -----------------------------------------------------------
+def get_forecast_engine():
+    engine = get_setting(FORECAST_ENGINE_SETTING, "hybrid")
+    return engine if engine in FORECAST_ENGINES else "hybrid"
+
 
+def set_forecast_engine(engine):
+    if engine not in FORECAST_ENGINES:
+        raise ValueError(f"Unknown forecast engine: {engine}")
+    set_setting(FORECAST_ENGINE_SETTING, engine)
+
+
+def generate_all_forecasts(engine=None, days=14):
+    engine = engine or get_forecast_engine()
+    if engine not in FORECAST_ENGINES:
+        raise ValueError(f"Unknown forecast engine: {engine}")
+
+    if engine == "global_gbm":
+        # imported lazily: the global engine needs scikit-learn and imports this module
+        from modules.global_forecasting import generate_global_forecasts
+        results = generate_global_forecasts(days)
+    else:
+        results = generate_forecasts_by_location(days=days)
+
+    # only an engine that produced forecasts becomes the one later single-product
+    # refreshes use; a failed run leaves the previous choice in place
+    set_forecast_engine(engine)
+    return results
+
+
+# -----------------------------------------------------------
+# Forecast one product (or one location) with the selected engine;
+# the hybrid is (SARIMA + Prophet) / 2
+# -----------------------------------------------------------
+def generate_forecast_for_product(product_id, days=14, warehouse_id=None):
+    # No location given → forecast every location and return the product total
+    if warehouse_id is None:
+        partitions = get_forecast_partitions(product_id)
+        if not partitions:
+            # not stocked or sold anywhere: nothing to store
+            return pd.Series([0.0] * days)
+        results = generate_forecasts_by_location(partitions, days)
+        return sum(results.values(), pd.Series([0.0] * days))
+
+    if get_forecast_engine() == "global_gbm":
+        from modules.global_forecasting import forecast_partition_global
+        forecast = forecast_partition_global(product_id, warehouse_id, days)
+        if forecast is not None:
+            return forecast
+        # no stored global model: never train the whole catalog in a stock write, use the hybrid
+
+    series = get_daily_sales_series(product_id, warehouse_id)
+
+    # Same demand series, config and horizon as the stored forecast → reuse it
+    fingerprint = forecast_fingerprint(series, HYBRID_CONFIG, days)
+    cached = get_cached_forecast(product_id, warehouse_id, fingerprint, days)
+    if cached is not None:
+        return cached
+
+    forecast, model_name = fit_hybrid(series, days)
+    save_forecast_to_db(product_id, forecast, model_name, warehouse_id)
+    store_cached_forecast(product_id, warehouse_id, fingerprint, days, model_name)
+    return forecast
+
+
+def fit_hybrid(series, days=14):
     # No sales history → return zero forecast
     if series.empty:
-        fallback = pd.Series([0.0] * days)
-        save_forecast_to_db(product_id, fallback, model_name='none')
-        return fallback
+        return pd.Series([0.0] * days), 'none'
 
     # ---- Train SARIMA ----
-    sarima_model = train_sarima(series)
+    sarima_model = train_sarima(series, HYBRID_CONFIG["seasonal_period"])
     sarima_fc = forecast_sarima(sarima_model, days) if sarima_model else None
 
     # ---- Train Prophet ----
@@ -121,38 +271,43 @@ def generate_forecast_for_product(product_id, days=14):
     # ---- Handle fallback cases ----
     if sarima_fc is None and prophet_fc is None:
         avg = series.mean()
-        fallback = pd.Series([avg] * days)
-        save_forecast_to_db(product_id, fallback, 'avg_fallback')
-        return fallback
+        return pd.Series([avg] * days), 'avg_fallback'
 
     if sarima_fc is None:
-        save_forecast_to_db(product_id, prophet_fc, 'prophet_only')
-        return prophet_fc
+        return prophet_fc, 'prophet_only'
 
     if prophet_fc is None:
-        save_forecast_to_db(product_id, sarima_fc, 'sarima_only')
-        return sarima_fc
+        return sarima_fc, 'sarima_only'
 
     # ⭐ FINAL HYBRID FORECAST ⭐
     hybrid = (sarima_fc + prophet_fc) / 2
-    save_forecast_to_db(product_id, hybrid, model_name="hybrid")
-
-    return hybrid
+    return hybrid, 'hybrid'
 
 
 # -----------------------------------------------------------
 # Fetch Latest Forecast (Used in Alerts)
 # -----------------------------------------------------------
-def get_latest_forecast(product_id, limit=14):
+def get_latest_forecast(product_id, limit=14, warehouse_id=None):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("""
-        SELECT forecast_date, forecast_qty 
-        FROM forecast_results 
-        WHERE product_id = ?
-        ORDER BY forecast_date 
-        LIMIT ?
-    """, (product_id, limit))
+    if warehouse_id is None:
+        # product-level forecast = sum of the per-location forecasts
+        cur.execute("""
+            SELECT forecast_date, SUM(forecast_qty) AS forecast_qty
+            FROM forecast_results
+            WHERE product_id = ?
+            GROUP BY forecast_date
+            ORDER BY forecast_date
+            LIMIT ?
+        """, (product_id, limit))
+    else:
+        cur.execute("""
+            SELECT forecast_date, forecast_qty 
+            FROM forecast_results 
+            WHERE product_id = ? AND warehouse_id = ?
+            ORDER BY forecast_date 
+            LIMIT ?
+        """, (product_id, warehouse_id, limit))
     rows = cur.fetchall()
     conn.close()
 
@@ -0,0 +1,332 @@
+# modules/global_forecasting.py
+import pickle
+import threading
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor
+from modules.database import get_connection
+from modules.preprocessing import get_daily_sales_series, get_daily_sales_by_partition
+from modules.forecasting import get_forecast_partitions, save_forecast_to_db, save_forecasts_bulk
+from modules.forecast_cache import (forecast_fingerprint, get_cached_forecast, store_cached_forecast,
+                                    store_cached_forecasts)
+
+# -----------------------------------------------------------
+# Global demand model
+#
+# One gradient-boosting model is trained on every (product, warehouse)
+# series at once. Each row is (partition, origin day, horizon h) with lag,
+# rolling-window, calendar and category features known at the origin, and
+# the target is demand h days later, so the whole 14 day horizon for the
+# whole catalog is a single predict() call.
+#
+# The trained model is stored in forecast_models, so a single location can
+# be re-forecast after a sale without retraining. Forecasts are cached under
+# a fingerprint that includes the model version.
+# -----------------------------------------------------------
+
+GLOBAL_MODEL_NAME = "global_gbm"
+
+# origins per partition used for training (most recent days)
+GLOBAL_TRAIN_DAYS = 120
+
+# below this many training rows the model is not fitted
+GLOBAL_MIN_TRAIN_ROWS = 200
+
+GLOBAL_MODEL_PARAMS = {
+    "loss": "poisson",
+    "learning_rate": 0.05,
+    "max_iter": 300,
+    "max_leaf_nodes": 31,
+    "min_samples_leaf": 20,
+    "random_state": 0,
+}
+
+# lag_k is demand k days before the forecast origin
+FEATURES = [
+    "lag_0", "lag_1", "lag_6", "lag_13",
+    "roll_mean_7", "roll_mean_28", "roll_std_7", "expanding_mean",
+    "horizon", "target_dow", "target_dom", "target_month",
+    "category", "warehouse",
+]
+CATEGORICAL = ["target_dow", "target_month", "category", "warehouse"]
+
+# HistGradientBoostingRegressor accepts at most this many values per categorical
+# feature (its max_bins); with more categories or warehouses the codes are used as numbers
+MAX_CATEGORIES = 255
+
+# the panel ends yesterday (today's sales are still coming in) and stored forecasts
+# start tomorrow, so the first forecast day is two days after the origin
+FIRST_HORIZON = 2
+
+# everything that changes the engine's output for a given series; part of the cache key
+GLOBAL_CONFIG = {
+    "engine": GLOBAL_MODEL_NAME,
+    "train_days": GLOBAL_TRAIN_DAYS,
+    "min_train_rows": GLOBAL_MIN_TRAIN_ROWS,
+    "params": GLOBAL_MODEL_PARAMS,
+    "features": FEATURES,
+    "first_horizon": FIRST_HORIZON,
+}
+
+_loaded = {"version": None, "bundle": None}
+_loaded_lock = threading.Lock()
+
+
+# -----------------------------------------------------------
+# Demand panel: dates x partitions up to yesterday, NaN before a partition's first sale
+# -----------------------------------------------------------
+def build_demand_panel(daily, partitions):
+    yesterday = pd.Timestamp.today().normalize() - pd.Timedelta(days=1)
+    columns = pd.MultiIndex.from_tuples(partitions, names=["product_id", "warehouse_id"])
+    present = {key: daily[key] for key in partitions if key in daily and not daily[key].empty}
+    if not present:
+        return pd.DataFrame(index=pd.DatetimeIndex([yesterday]), columns=columns, dtype=float)
+
+    # today is left out of both features and targets until it is over
+    wide = pd.concat(present, axis=1)
+    dates = pd.date_range(min(wide.index.min(), yesterday), yesterday, freq="D")
+    wide = wide.reindex(index=dates, columns=columns).astype(float)
+
+    # zero-fill only after the first sale so unlaunched days are not read as no demand
+    started = wide.notna().cumsum() > 0
+    return wide.fillna(0.0).where(started)
+
+
+def _panel_features(panel):
+    return {
+        "lag_0": panel,
+        "lag_1": panel.shift(1),
+        "lag_6": panel.shift(6),
+        "lag_13": panel.shift(13),
+        "roll_mean_7": panel.rolling(7, min_periods=1).mean(),
+        "roll_mean_28": panel.rolling(28, min_periods=1).mean(),
+        "roll_std_7": panel.rolling(7, min_periods=2).std(),
+        "expanding_mean": panel.expanding().mean(),
+    }
+
+
+def _category_of():
+    conn = get_connection()
+    categories = pd.read_sql_query("SELECT product_id, IFNULL(category, '') AS category FROM products", conn)
+    conn.close()
+    return dict(zip(categories["product_id"], categories["category"]))
+
+
+def build_code_maps(partitions):
+    """Stable category / warehouse codes, stored with the model."""
+    category_of = _category_of()
+    categories = sorted({category_of.get(pid, "") for pid, _ in partitions})
+    warehouses = sorted({wid for _, wid in partitions})
+    return ({c: i for i, c in enumerate(categories)},
+            {w: i for i, w in enumerate(warehouses)})
+
+
+def _partition_codes(partitions, category_map, warehouse_map):
+    # unseen categories / warehouses become NaN, which the model treats as missing
+    category_of = _category_of()
+    category_codes = np.array([category_map.get(category_of.get(pid, ""), np.nan) for pid, _ in partitions],
+                              dtype=float)
+    warehouse_codes = np.array([warehouse_map.get(wid, np.nan) for _, wid in partitions], dtype=float)
+    return category_codes, warehouse_codes
+
+
+def _rows(features, dates, t_idx, p_idx, horizon, category_codes, warehouse_codes):
+    """Feature frame for origins (t_idx, p_idx) forecasting `horizon` days ahead."""
+    target_dates = dates[t_idx] + pd.to_timedelta(horizon, unit="D")
+    frame = {name: values[t_idx, p_idx] for name, values in features.items()}
+    frame["horizon"] = horizon
+    frame["target_dow"] = target_dates.dayofweek
+    frame["target_dom"] = target_dates.day
+    frame["target_month"] = target_dates.month - 1
+    frame["category"] = category_codes[p_idx]
+    frame["warehouse"] = warehouse_codes[p_idx]
+    return pd.DataFrame(frame, columns=FEATURES)
+
+
+def build_training_set(panel, days, category_codes, warehouse_codes):
+    values = panel.to_numpy()
+    features = {name: f.to_numpy() for name, f in _panel_features(panel).items()}
+    dates = panel.index
+    n_days = len(dates)
+
+    X_parts, y_parts = [], []
+    for h in range(FIRST_HORIZON, FIRST_HORIZON + days):
+        # origins whose target (t + h) is already observed
+        first = max(0, n_days - h - GLOBAL_TRAIN_DAYS)
+        t_idx, p_idx = np.nonzero(~np.isnan(values[first:n_days - h]))
+        t_idx = t_idx + first
+        if len(t_idx) == 0:
+            continue
+        X_parts.append(_rows(features, dates, t_idx, p_idx, np.full(len(t_idx), h),
+                             category_codes, warehouse_codes))
+        y_parts.append(values[t_idx + h, p_idx])
+
+    if not X_parts:
+        return pd.DataFrame(columns=FEATURES), np.array([])
+    return pd.concat(X_parts, ignore_index=True), np.concatenate(y_parts)
+
+
+def build_prediction_set(panel, days, category_codes, warehouse_codes):
+    values = panel.to_numpy()
+    features = {name: f.to_numpy() for name, f in _panel_features(panel).items()}
+    last = len(panel.index) - 1
+
+    # partitions with any history, every horizon, in one frame
+    p_active = np.nonzero(~np.isnan(values[last]))[0]
+    p_idx = np.repeat(p_active, days)
+    horizon = np.tile(np.arange(FIRST_HORIZON, FIRST_HORIZON + days), len(p_active))
+    t_idx = np.full(len(p_idx), last)
+    return _rows(features, panel.index, t_idx, p_idx, horizon, category_codes, warehouse_codes), p_active
+
+
+def train_global_model(X, y):
+    # poisson loss needs some non-zero demand to fit
+    if len(y) < GLOBAL_MIN_TRAIN_ROWS or y.sum() <= 0:
+        return None
+    categorical = [c in CATEGORICAL and X[c].max() < MAX_CATEGORIES for c in FEATURES]
+    model = HistGradientBoostingRegressor(categorical_features=categorical, **GLOBAL_MODEL_PARAMS)
+    model.fit(X, y)
+    return model
+
+
+# -----------------------------------------------------------
+# Model store
+# -----------------------------------------------------------
+def save_global_model(bundle):
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    cur.execute("SELECT IFNULL(MAX(version), 0) + 1 AS v FROM forecast_models WHERE name = ?",
+                (GLOBAL_MODEL_NAME,))
+    version = cur.fetchone()["v"]
+    cur.execute("""
+        INSERT OR REPLACE INTO forecast_models (name, version, trained_at, model)
+        VALUES (?, ?, datetime('now','localtime'), ?)
+    """, (GLOBAL_MODEL_NAME, version, pickle.dumps(bundle)))
+    conn.commit()
+    conn.close()
+
+    with _loaded_lock:
+        _loaded["version"], _loaded["bundle"] = version, bundle
+    return version
+
+
+def load_global_model():
+    """Returns (bundle, version), or (None, None) if the model was never trained."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT version FROM forecast_models WHERE name = ?", (GLOBAL_MODEL_NAME,))
+    row = cur.fetchone()
+    if row is None:
+        conn.close()
+        return None, None
+
+    with _loaded_lock:
+        if _loaded["version"] == row["version"]:
+            conn.close()
+            return _loaded["bundle"], row["version"]
+
+    cur.execute("SELECT version, model FROM forecast_models WHERE name = ?", (GLOBAL_MODEL_NAME,))
+    row = cur.fetchone()
+    conn.close()
+    bundle = pickle.loads(row["model"])
+    with _loaded_lock:
+        _loaded["version"], _loaded["bundle"] = row["version"], bundle
+    return bundle, row["version"]
+
+
+def global_fingerprint(series, version, days):
+    return forecast_fingerprint(series, {**GLOBAL_CONFIG, "model_version": version}, days)
+
+
+def _predict(bundle, panel, partitions, days):
+    """{partition index: forecast} for partitions with history, using the stored model."""
+    category_codes, warehouse_codes = _partition_codes(partitions, bundle["categories"], bundle["warehouses"])
+    X_pred, p_active = build_prediction_set(panel, days, category_codes, warehouse_codes)
+    if not len(p_active):
+        return {}
+    preds = np.clip(bundle["model"].predict(X_pred), 0, None).reshape(len(p_active), days)
+    return {p: pd.Series(preds[row]) for row, p in enumerate(p_active)}
+
+
+# -----------------------------------------------------------
+# Train once and forecast the whole catalog under GLOBAL_MODEL_NAME
+# -----------------------------------------------------------
+def generate_global_forecasts(days=14):
+    partitions = get_forecast_partitions()
+    if not partitions:
+        return {}
+
+    daily = get_daily_sales_by_partition()
+    panel = build_demand_panel(daily, partitions)
+    category_map, warehouse_map = build_code_maps(partitions)
+    category_codes, warehouse_codes = _partition_codes(partitions, category_map, warehouse_map)
+
+    X_train, y_train = build_training_set(panel, days, category_codes, warehouse_codes)
+    bundle = {
+        "model": train_global_model(X_train, y_train),
+        "categories": category_map,
+        "warehouses": warehouse_map,
+    }
+    version = save_global_model(bundle)
+
+    forecasts, fallbacks, empty = {}, {}, {}
+    if bundle["model"] is not None:
+        for p, fc in _predict(bundle, panel, partitions, days).items():
+            forecasts[partitions[p]] = fc
+
+    for key in partitions:
+        if key in forecasts:
+            continue
+        if key in daily and not daily[key].empty:
+            # too little history for a global fit, or first sold today → per-partition average
+            fallbacks[key] = pd.Series([float(daily[key].mean())] * days)
+        else:
+            # no sales history → zero forecast, same as the hybrid
+            empty[key] = pd.Series([0.0] * days)
+
+    save_forecasts_bulk(forecasts, GLOBAL_MODEL_NAME)
+    save_forecasts_bulk(fallbacks, "avg_fallback")
+    save_forecasts_bulk(empty, "none")
+
+    # cache every partition so unchanged ones are not recomputed by later refreshes
+    entries = []
+    for label, group in ((GLOBAL_MODEL_NAME, forecasts), ("avg_fallback", fallbacks), ("none", empty)):
+        for (pid, wid) in group:
+            series = daily.get((pid, wid), pd.Series(dtype=float))
+            entries.append((pid, wid, global_fingerprint(series, version, days), days, label))
+    store_cached_forecasts(entries)
+
+    return {**empty, **fallbacks, **forecasts}
+
+
+# -----------------------------------------------------------
+# Re-forecast one location with the stored model (no retraining)
+# -----------------------------------------------------------
+def forecast_partition_global(product_id, warehouse_id, days=14):
+    """Returns None if no model is stored; training is left to generate_global_forecasts()."""
+    bundle, version = load_global_model()
+    if bundle is None:
+        return None
+
+    series = get_daily_sales_series(product_id, warehouse_id)
+    fingerprint = global_fingerprint(series, version, days)
+    cached = get_cached_forecast(product_id, warehouse_id, fingerprint, days)
+    if cached is not None:
+        return cached
+
+    key = (product_id, warehouse_id)
+    forecast = None
+    if bundle["model"] is not None and not series.empty:
+        panel = build_demand_panel({key: series}, [key])
+        forecast, label = _predict(bundle, panel, [key], days).get(0), GLOBAL_MODEL_NAME
+    if forecast is None:
+        if series.empty:
+            forecast, label = pd.Series([0.0] * days), "none"
+        else:
+            # too little history for a global fit, or first sold today
+            forecast, label = pd.Series([float(series.mean())] * days), "avg_fallback"
+
+    save_forecast_to_db(product_id, forecast, label, warehouse_id)
+    store_cached_forecast(product_id, warehouse_id, fingerprint, days, label)
+    return forecast
@@ -1,23 +1,72 @@
-from modules.database import get_connection
+from modules.database import get_connection, get_default_warehouse_id
+from modules.change_log import record_change
 from datetime import datetime
 from modules.alerts import send_stock_alert_email, record_alert
 from modules.forecasting import generate_forecast_for_product, get_latest_forecast
 import pandas as pd
 
+# -------------------------------------------------------------------------
+# STOCK WRITES — SQLite has a single writer per database, so each
+# read-check-write runs inside BEGIN IMMEDIATE. That takes the write lock
+# before the current stock is read, which keeps it atomic across threads
+# and processes. Writes are short, so sites only wait on each other briefly.
+# -------------------------------------------------------------------------
+def _begin_stock_write(conn):
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    return cur
+
+def _resolve_warehouse(cur, warehouse_id):
+    return get_default_warehouse_id(cur) if warehouse_id is None else warehouse_id
+
 def get_all_products():
     conn = get_connection()
     cur = conn.cursor()
     cur.execute("""
         SELECT p.product_id, p.name, p.category, p.min_stock, p.early_warning_stock, 
-               IFNULL(i.current_stock, 0) as current_stock, i.last_updated
+               IFNULL(s.current_stock, 0) as current_stock, s.last_updated
         FROM products p
-        LEFT JOIN inventory i ON p.product_id = i.product_id
+        LEFT JOIN product_stock s ON p.product_id = s.product_id
         ORDER BY p.name
     """)
     rows = cur.fetchall()
     conn.close()
     return [dict(r) for r in rows]
 
+def get_all_warehouses():
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT warehouse_id, name, region, city, state FROM warehouses ORDER BY name")
+    rows = cur.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+def get_stock_by_location(product_id=None):
+    conn = get_connection()
+    cur = conn.cursor()
+    query = """
+        SELECT i.product_id, p.name, i.warehouse_id, w.name as warehouse,
+               i.current_stock, i.last_updated
+        FROM inventory i
+        JOIN products p ON p.product_id = i.product_id
+        JOIN warehouses w ON w.warehouse_id = i.warehouse_id
+    """
+    if product_id is None:
+        cur.execute(query + " ORDER BY p.name, w.name")
+    else:
+        cur.execute(query + " WHERE i.product_id = ? ORDER BY w.name", (product_id,))
+    rows = cur.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+def get_warehouse_totals():
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM warehouse_stock ORDER BY name")
+    rows = cur.fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
 def set_min_stock(product_id, min_stock, early_warning=None):
     try:
         min_stock = int(min_stock)
@@ -44,6 +93,9 @@ def set_min_stock(product_id, min_stock, early_warning=None):
         SET min_stock = ?, early_warning_stock = ? 
         WHERE product_id = ?
     """, (min_stock, early_warning, product_id))
+    if cur.rowcount:
+        record_change(cur, "products", "update", product_id,
+                      min_stock=min_stock, early_warning_stock=early_warning)
 
     conn.commit()
     conn.close()
@@ -52,11 +104,13 @@ def set_min_stock(product_id, min_stock, early_warning=None):
 # -------------------------------------------------------------------------
 # UPDATE STOCK — PREVENT NEGATIVE AND LIMIT TO 4 DIGITS
 # -------------------------------------------------------------------------
-def update_stock(product_id, new_qty):
+def update_stock(product_id, new_qty, warehouse_id=None):
     conn = get_connection()
-    cur = conn.cursor()
+    cur = _begin_stock_write(conn)
+    warehouse_id = _resolve_warehouse(cur, warehouse_id)
 
-    cur.execute("SELECT current_stock FROM inventory WHERE product_id = ?", (product_id,))
+    cur.execute("SELECT current_stock FROM inventory WHERE product_id = ? AND warehouse_id = ?",
+                (product_id, warehouse_id))
     row = cur.fetchone()
 
     current_stock = int(row["current_stock"]) if row else 0
@@ -64,26 +118,30 @@ def update_stock(product_id, new_qty):
 
     # Prevent negative
     if updated_stock < 0:
+        conn.rollback()
         conn.close()
         return "NEGATIVE_STOCK_ERROR"
 
     # Prevent exceeding 4 digits
     if updated_stock > 9999:
+        conn.rollback()
         conn.close()
         return "MAX_STOCK_LIMIT"
 
     # Update/inset stock
     cur.execute("""
-        INSERT INTO inventory (product_id, current_stock, last_updated)
-        VALUES (?, ?, datetime('now','localtime'))
-        ON CONFLICT(product_id)
+        INSERT INTO inventory (product_id, warehouse_id, current_stock, last_updated)
+        VALUES (?, ?, ?, datetime('now','localtime'))
+        ON CONFLICT(product_id, warehouse_id)
         DO UPDATE SET current_stock = ?, last_updated = datetime('now','localtime')
-    """, (product_id, updated_stock, updated_stock))
+    """, (product_id, warehouse_id, updated_stock, updated_stock))
+    record_change(cur, "inventory", "upsert", product_id, warehouse_id,
+                  current_stock=updated_stock, delta=int(new_qty))
 
     conn.commit()
     conn.close()
 
-    generate_forecast_for_product(product_id)
+    generate_forecast_for_product(product_id, warehouse_id=warehouse_id)
     check_and_handle_alert(product_id)
 
     return updated_stock
@@ -91,11 +149,13 @@ def update_stock(product_id, new_qty):
 # -------------------------------------------------------------------------
 # RECORD SALE — PREVENT NEGATIVE AND LIMIT TO 4 DIGITS
 # -------------------------------------------------------------------------
-def adjust_stock_by_sale(product_id, sold_qty, per_unit_price=None):
+def adjust_stock_by_sale(product_id, sold_qty, per_unit_price=None, warehouse_id=None):
     conn = get_connection()
-    cur = conn.cursor()
+    cur = _begin_stock_write(conn)
+    warehouse_id = _resolve_warehouse(cur, warehouse_id)
 
-    cur.execute("SELECT current_stock FROM inventory WHERE product_id = ?", (product_id,))
+    cur.execute("SELECT current_stock FROM inventory WHERE product_id = ? AND warehouse_id = ?",
+                (product_id, warehouse_id))
     row = cur.fetchone()
 
     current_stock = int(row["current_stock"]) if row else 0
@@ -103,11 +163,13 @@ def adjust_stock_by_sale(product_id, sold_qty, per_unit_price=None):
 
     # Prevent negative stock
     if new_stock < 0:
+        conn.rollback()
         conn.close()
         return "NEGATIVE_STOCK_ERROR"
 
     # Prevent exceeding 4 digits
     if new_stock > 9999:
+        conn.rollback()
         conn.close()
         return "MAX_STOCK_LIMIT"
 
@@ -115,19 +177,23 @@ def adjust_stock_by_sale(product_id, sold_qty, per_unit_price=None):
     cur.execute("""
         UPDATE inventory
         SET current_stock = ?, last_updated = datetime('now','localtime')
-        WHERE product_id = ?
-    """, (new_stock, product_id))
+        WHERE product_id = ? AND warehouse_id = ?
+    """, (new_stock, product_id, warehouse_id))
+    record_change(cur, "inventory", "upsert", product_id, warehouse_id,
+                  current_stock=new_stock, delta=-int(sold_qty))
 
     # Record sale
     cur.execute("""
-        INSERT INTO sales (product_id, sale_qty, sale_date, per_unit_price)
-        VALUES (?, ?, datetime('now','localtime'), ?)
-    """, (product_id, sold_qty, per_unit_price))
+        INSERT INTO sales (product_id, warehouse_id, sale_qty, sale_date, per_unit_price)
+        VALUES (?, ?, ?, datetime('now','localtime'), ?)
+    """, (product_id, warehouse_id, sold_qty, per_unit_price))
+    record_change(cur, "sales", "insert", product_id, warehouse_id,
+                  sale_id=cur.lastrowid, sale_qty=int(sold_qty), per_unit_price=per_unit_price)
 
     conn.commit()
     conn.close()
 
-    generate_forecast_for_product(product_id)
+    generate_forecast_for_product(product_id, warehouse_id=warehouse_id)
     check_and_handle_alert(product_id)
 
     return new_stock
@@ -135,11 +201,15 @@ def adjust_stock_by_sale(product_id, sold_qty, per_unit_price=None):
 # -------------------------------------------------------------------------
 # ALERT LOGIC (unchanged)
 # -------------------------------------------------------------------------
-def get_sales_for_product(product_id):
+def get_sales_for_product(product_id, warehouse_id=None):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("SELECT sale_date, sale_qty FROM sales WHERE product_id = ? ORDER BY sale_date",
-                (product_id,))
+    if warehouse_id is None:
+        cur.execute("SELECT sale_date, sale_qty, warehouse_id FROM sales WHERE product_id = ? ORDER BY sale_date",
+                    (product_id,))
+    else:
+        cur.execute("SELECT sale_date, sale_qty, warehouse_id FROM sales WHERE product_id = ? AND warehouse_id = ? ORDER BY sale_date",
+                    (product_id, warehouse_id))
     rows = cur.fetchall()
     conn.close()
     return [dict(r) for r in rows]
@@ -150,9 +220,9 @@ def check_and_handle_alert(product_id):
     cur = conn.cursor()
     cur.execute("""
         SELECT p.name, p.min_stock, p.early_warning_stock, 
-               IFNULL(i.current_stock,0) as current_stock
+               IFNULL(s.current_stock,0) as current_stock
         FROM products p 
-        LEFT JOIN inventory i ON p.product_id = i.product_id 
+        LEFT JOIN product_stock s ON p.product_id = s.product_id 
         WHERE p.product_id = ?
     """, (product_id,))
     row = cur.fetchone()
@@ -2,18 +2,39 @@
 import pandas as pd
 from modules.database import get_connection
 
-def get_daily_sales_series(product_id):
+def get_daily_sales_series(product_id, warehouse_id=None):
     """
     Returns a pandas Series (indexed by date) of daily sold quantities for given product_id.
-    Aggregates the sales table.
+    Aggregates the sales table. With a warehouse_id only that location's sales are
+    used, otherwise sales from every location are summed.
     """
     conn = get_connection()
-    df = pd.read_sql_query("SELECT sale_date, sale_qty FROM sales WHERE product_id = ?", conn, params=(product_id,))
+    if warehouse_id is None:
+        df = pd.read_sql_query("SELECT sale_date, sale_qty FROM sales WHERE product_id = ?", conn, params=(product_id,))
+    else:
+        df = pd.read_sql_query("SELECT sale_date, sale_qty FROM sales WHERE product_id = ? AND warehouse_id = ?",
+                               conn, params=(product_id, warehouse_id))
     conn.close()
+    return _to_daily_series(df)
+
+def get_daily_sales_by_partition():
+    """
+    Returns {(product_id, warehouse_id): daily series} for every partition with
+    sales, in one query. Each series is identical to get_daily_sales_series().
+    """
+    conn = get_connection()
+    df = pd.read_sql_query("SELECT product_id, warehouse_id, sale_date, sale_qty FROM sales", conn)
+    conn.close()
+    return {
+        (int(pid), int(wid)): _to_daily_series(group)
+        for (pid, wid), group in df.groupby(['product_id', 'warehouse_id'])
+    }
+
+def _to_daily_series(df):
     if df.empty:
         return pd.Series(dtype=float)
-    df['sale_date'] = pd.to_datetime(df['sale_date']).dt.date
-    daily = df.groupby('sale_date')['sale_qty'].sum().sort_index()
+    dates = pd.to_datetime(df['sale_date']).dt.date.rename('sale_date')
+    daily = df['sale_qty'].groupby(dates).sum().sort_index()
     series = daily.astype(float)
     series.index = pd.to_datetime(series.index)
     return series
@@ -2,18 +2,43 @@
 import schedule
 import time
 from threading import Thread
-from modules.inventory_manager import get_all_products, check_and_handle_alert
-from modules.database import get_connection
+from modules.inventory_manager import check_and_handle_alert
+from modules.forecasting import generate_forecast_for_product
+from modules.analytics import refresh_analytics, ANALYTICS_CONSUMER
+from modules.change_log import consume_changes, changed_partitions, prune_change_log
 
-def check_low_stock_and_alert(email_for_alerts=None):
-    products = get_all_products()
-    for p in products:
-        pid = p['product_id']
-        check_and_handle_alert(pid, email_for_alerts=email_for_alerts)
+# change_log consumers; each keeps its own durable cursor
+ALERTS_CONSUMER = "alerts"
+FORECASTS_CONSUMER = "forecasts"
 
-def schedule_periodic_checks(email_for_alerts=None, interval_minutes=60):
+# every consumer of change_log; entries are pruned only once all of them have read them
+CHANGE_LOG_CONSUMERS = (ALERTS_CONSUMER, FORECASTS_CONSUMER, ANALYTICS_CONSUMER)
+
+def check_low_stock_and_alert():
+    # only products whose stock or thresholds changed since the last sweep
+    def handle(changes):
+        for pid in dict.fromkeys(c["product_id"] for c in changes):
+            check_and_handle_alert(pid)
+
+    return consume_changes(ALERTS_CONSUMER, handle, tables=("inventory", "products"))
+
+def refresh_changed_forecasts():
+    # only locations with new sales; stock corrections don't change demand
+    def handle(changes):
+        for pid, wid in changed_partitions(changes):
+            generate_forecast_for_product(pid, warehouse_id=wid)
+
+    return consume_changes(FORECASTS_CONSUMER, handle, tables=("sales",))
+
+def run_incremental_jobs():
+    refresh_changed_forecasts()
+    check_low_stock_and_alert()
+    refresh_analytics()
+    prune_change_log(CHANGE_LOG_CONSUMERS)
+
+def schedule_periodic_checks(interval_minutes=60):
     schedule.clear()
-    schedule.every(interval_minutes).minutes.do(check_low_stock_and_alert, email_for_alerts=email_for_alerts)
+    schedule.every(interval_minutes).minutes.do(run_incremental_jobs)
 
     def run_loop():
         while True:
@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# modules.database creates its tables on import; keep that out of the working tree
+os.environ.setdefault("INVENTORY_DB", os.path.join(tempfile.mkdtemp(), "inventory.db"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from modules import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "inventory.db")
+    database.init_db()
+    conn = database.get_connection()
+    yield conn
+    conn.close()
@@ -0,0 +1,76 @@
+import pytest
+
+from modules import analytics
+
+
+def _seed(db):
+    db.executescript("""
+        INSERT INTO warehouses (name) VALUES ('Sydney');
+        INSERT INTO products (name, category, price) VALUES ('cpu', 'CPU', 10.0), ('ram', 'RAM', 2.0);
+        INSERT INTO inventory VALUES (1, 1, 30, 'x'), (2, 1, 4, 'x');
+        INSERT INTO sales (product_id, warehouse_id, sale_qty, sale_date)
+        VALUES (1, 1, 3, datetime('now','localtime','-1 day')),
+               (1, 1, 2, datetime('now','localtime'));
+        INSERT INTO forecast_results (product_id, warehouse_id, forecast_date, forecast_qty, model)
+        VALUES (1, 1, date('now','localtime','-1 day'), 4.0, 'hybrid'),
+               (1, 1, date('now','localtime'), 9.0, 'hybrid');
+    """)
+    db.commit()
+
+
+def test_idle_refresh_is_read_only(db):
+    _seed(db)
+    assert analytics.refresh_analytics() == 2
+    before = db.execute("SELECT refreshed_at FROM analytics_refresh_state").fetchone()[0]
+    db.execute("UPDATE analytics_refresh_state SET refreshed_at = 'sentinel'")
+    db.commit()
+
+    assert analytics.refresh_analytics() == 0
+    assert before is not None
+    assert db.execute("SELECT refreshed_at FROM analytics_refresh_state").fetchone()[0] == "sentinel"
+
+
+def test_only_finished_days_are_scored(db):
+    _seed(db)
+    analytics.refresh_analytics()
+    rows = db.execute("""
+        SELECT forecast_qty, actual_qty, abs_error FROM analytics_forecast_accuracy ORDER BY forecast_date
+    """).fetchall()
+    assert [tuple(r) for r in rows] == [(4.0, 3.0, 1.0), (9.0, None, None)]
+    assert [(a["days"], a["actual_qty"]) for a in analytics.get_forecast_accuracy()] == [(1, 3.0)]
+
+
+def test_refit_after_a_sale_keeps_the_captured_forecasts(db, monkeypatch):
+    pd = pytest.importorskip("pandas")
+    forecasting = pytest.importorskip("modules.forecasting")
+    inventory_manager = pytest.importorskip("modules.inventory_manager")
+    monkeypatch.setattr(forecasting, "fit_hybrid", lambda series, days=14: (pd.Series([1.0] * days), "hybrid"))
+    monkeypatch.setattr(inventory_manager, "check_and_handle_alert", lambda *a, **k: None)
+    db.executescript("""
+        INSERT INTO warehouses (name) VALUES ('Sydney'), ('Toronto');
+        INSERT INTO products (name, category, price) VALUES ('cpu', 'CPU', 10.0);
+        INSERT INTO inventory VALUES (1, 1, 30, 'x'), (1, 2, 30, 'x');
+    """)
+    db.commit()
+    forecasting.save_forecast_to_db(1, pd.Series([4.0] * 14), "hybrid", warehouse_id=1)
+    forecasting.save_forecast_to_db(1, pd.Series([6.0] * 14), "hybrid", warehouse_id=2)
+
+    # the sale refits Sydney, replacing its rows in forecast_results before any refresh ran
+    inventory_manager.adjust_stock_by_sale(1, 2, warehouse_id=1)
+    assert db.execute("SELECT DISTINCT forecast_qty FROM forecast_results WHERE warehouse_id = 1").fetchall()[0][0] == 1.0
+
+    analytics.refresh_analytics()
+    rows = db.execute("""
+        SELECT warehouse_id, COUNT(*), MIN(forecast_qty), MAX(forecast_qty), COUNT(actual_qty)
+        FROM analytics_forecast_accuracy GROUP BY warehouse_id
+    """).fetchall()
+    assert [tuple(r) for r in rows] == [(1, 14, 4.0, 4.0, 0), (2, 14, 6.0, 6.0, 0)]
+
+
+def test_summary_reflects_sales_and_stock(db):
+    _seed(db)
+    analytics.refresh_analytics()
+    movers = analytics.get_top_movers()
+    assert [(m["name"], m["units_sold_30d"], m["mover_rank"]) for m in movers] == [("cpu", 5, 1)]
+    categories = {c["category"]: c["current_stock"] for c in analytics.get_category_summary()}
+    assert categories == {"CPU": 30, "RAM": 4}
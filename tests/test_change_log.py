@@ -0,0 +1,84 @@
+import pytest
+
+pytest.importorskip("prophet")
+pytest.importorskip("pmdarima")
+
+from modules import change_log, inventory_manager
+
+
+@pytest.fixture
+def catalog(db, monkeypatch):
+    # the forecast and alert that follow each stock write aren't under test here
+    monkeypatch.setattr(inventory_manager, "generate_forecast_for_product", lambda *a, **k: None)
+    monkeypatch.setattr(inventory_manager, "check_and_handle_alert", lambda *a, **k: None)
+    db.executescript("""
+        INSERT INTO warehouses (name) VALUES ('Southlake Texas');
+        INSERT INTO products (name, category, price) VALUES ('cpu', 'CPU', 10.0);
+    """)
+    db.commit()
+    return db
+
+
+def _logged(db):
+    return [(r["table_name"], r["op"]) for r in db.execute("SELECT * FROM change_log ORDER BY seq")]
+
+
+def test_writes_are_logged_with_one_op_per_kind(catalog):
+    inventory_manager.update_stock(1, 5, warehouse_id=1)
+    inventory_manager.adjust_stock_by_sale(1, 2, warehouse_id=1)
+    inventory_manager.set_min_stock(1, 3)
+
+    assert _logged(catalog) == [
+        ("inventory", "upsert"),
+        ("inventory", "upsert"),
+        ("sales", "insert"),
+        ("products", "update"),
+    ]
+
+
+def test_rejected_and_unmatched_writes_are_not_logged(catalog):
+    assert inventory_manager.adjust_stock_by_sale(1, 5, warehouse_id=1) == "NEGATIVE_STOCK_ERROR"
+    inventory_manager.set_min_stock(999, 3)
+
+    assert _logged(catalog) == []
+
+
+def test_filtered_consumer_moves_past_other_tables(catalog):
+    inventory_manager.update_stock(1, 5, warehouse_id=1)
+    inventory_manager.adjust_stock_by_sale(1, 2, warehouse_id=1)
+    inventory_manager.update_stock(1, 8, warehouse_id=1)
+
+    seen = []
+    assert change_log.consume_changes("forecasts", seen.extend, tables=("sales",)) == 1
+    assert [c["table_name"] for c in seen] == ["sales"]
+
+    cur = catalog.cursor()
+    assert change_log.get_cursor_position(cur, "forecasts") == change_log.get_latest_seq(cur)
+
+
+def test_failed_handler_leaves_the_cursor_in_place(catalog):
+    inventory_manager.update_stock(1, 5, warehouse_id=1)
+
+    def fail(changes):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        change_log.consume_changes("alerts", fail)
+    assert change_log.get_cursor_position(catalog.cursor(), "alerts") == 0
+
+    seen = []
+    change_log.consume_changes("alerts", seen.extend)
+    assert len(seen) == 1
+
+
+def test_prune_keeps_what_a_consumer_that_never_ran_has_not_read(catalog):
+    inventory_manager.update_stock(1, 5, warehouse_id=1)
+    inventory_manager.update_stock(1, 6, warehouse_id=1)
+    change_log.consume_changes("alerts", lambda changes: None)
+
+    assert change_log.prune_change_log(("alerts", "forecasts")) == 0
+    assert len(_logged(catalog)) == 2
+
+    change_log.consume_changes("forecasts", lambda changes: None)
+    assert change_log.prune_change_log(("alerts", "forecasts")) == 2
+    assert _logged(catalog) == []
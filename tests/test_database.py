@@ -0,0 +1,99 @@
+import sqlite3
+
+from modules import database
+
+# schema as it was before inventory was partitioned by warehouse
+BASELINE_SCHEMA = """
+CREATE TABLE products (
+    product_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE,
+    category TEXT,
+    min_stock INTEGER,
+    early_warning_stock INTEGER,
+    price REAL
+);
+CREATE TABLE inventory (
+    product_id INTEGER PRIMARY KEY,
+    current_stock INTEGER DEFAULT 0,
+    last_updated TEXT
+);
+CREATE TABLE sales (
+    sale_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER,
+    sale_qty INTEGER,
+    sale_date TEXT,
+    per_unit_price REAL
+);
+CREATE TABLE forecast_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER,
+    forecast_date TEXT,
+    forecast_qty REAL,
+    model TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE alerts (
+    alert_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER,
+    alert_type TEXT,
+    message TEXT,
+    sent_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+def test_baseline_database_is_migrated_into_default_warehouse(tmp_path, monkeypatch):
+    path = tmp_path / "inventory.db"
+    legacy = sqlite3.connect(str(path))
+    legacy.executescript(BASELINE_SCHEMA + """
+        INSERT INTO products (name, category) VALUES ('cpu', 'CPU'), ('ram', 'RAM');
+        INSERT INTO inventory VALUES (1, 7, '2024-01-01'), (2, 3, '2024-01-01');
+        INSERT INTO sales (product_id, sale_qty, sale_date) VALUES (1, 2, '2024-01-01 10:00:00');
+        INSERT INTO forecast_results (product_id, forecast_date, forecast_qty, model)
+        VALUES (1, '2024-01-02', 1.5, 'hybrid');
+    """)
+    legacy.commit()
+    legacy.close()
+
+    monkeypatch.setattr(database, "DB_PATH", path)
+    database.init_db()
+    database.init_db()  # migration is idempotent
+
+    conn = database.get_connection()
+    default_id = conn.execute("SELECT warehouse_id FROM warehouses WHERE name = ?",
+                              (database.DEFAULT_WAREHOUSE,)).fetchone()["warehouse_id"]
+
+    inventory = [tuple(r) for r in conn.execute(
+        "SELECT product_id, warehouse_id, current_stock FROM inventory ORDER BY product_id")]
+    assert inventory == [(1, default_id, 7), (2, default_id, 3)]
+    assert conn.execute("SELECT warehouse_id FROM sales").fetchone()[0] == default_id
+    assert conn.execute("SELECT warehouse_id FROM forecast_results").fetchone()[0] == default_id
+
+    totals = dict(conn.execute("SELECT product_id, current_stock FROM product_stock").fetchall())
+    assert totals == {1: 7, 2: 3}
+    assert conn.execute("SELECT COUNT(*) FROM warehouses").fetchone()[0] == 1
+    conn.close()
+
+
+def test_fresh_database_has_no_default_warehouse(db):
+    assert db.execute("SELECT COUNT(*) FROM warehouses").fetchone()[0] == 0
+
+
+def test_old_forecast_accuracy_is_rebuilt_per_warehouse(db):
+    db.executescript("""
+        DROP TABLE analytics_forecast_accuracy;
+        CREATE TABLE analytics_forecast_accuracy (
+            product_id INTEGER, forecast_date TEXT, forecast_qty REAL, actual_qty REAL, abs_error REAL,
+            PRIMARY KEY (product_id, forecast_date)
+        );
+        INSERT INTO analytics_forecast_accuracy VALUES (1, '2024-01-02', 6.0, 5.0, 1.0);
+        INSERT INTO analytics_refresh_state (id, last_forecast_id) VALUES (1, 42);
+    """)
+    db.commit()
+
+    database.init_db()
+
+    cols = [r["name"] for r in db.execute("PRAGMA table_info(analytics_forecast_accuracy)")]
+    assert "warehouse_id" in cols
+    assert db.execute("SELECT COUNT(*) FROM analytics_forecast_accuracy").fetchone()[0] == 0
+    assert db.execute("SELECT last_forecast_id FROM analytics_refresh_state").fetchone()[0] == 0
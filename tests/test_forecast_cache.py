@@ -0,0 +1,69 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("prophet")
+pytest.importorskip("pmdarima")
+
+from modules import forecast_cache, forecasting, inventory_manager
+
+
+@pytest.fixture
+def fits(db, monkeypatch):
+    db.executescript("""
+        INSERT INTO warehouses (name) VALUES ('Sydney');
+        INSERT INTO products (name, category, price) VALUES ('cpu', 'CPU', 10.0), ('ram', 'RAM', 2.0);
+    """)
+    db.commit()
+    forecast_cache.reset_cache_stats()
+
+    # the fit itself is not under test; count how often the cache lets it run
+    calls = []
+
+    def fake_fit(series, days=14):
+        calls.append(len(series))
+        return pd.Series([float(len(calls))] * days), "hybrid"
+
+    monkeypatch.setattr(forecasting, "fit_hybrid", fake_fit)
+    return calls
+
+
+def test_stock_correction_reuses_stored_forecast(fits):
+    inventory_manager.update_stock(1, 10, warehouse_id=1)
+    inventory_manager.update_stock(1, -4, warehouse_id=1)
+
+    assert len(fits) == 1
+    stats = forecast_cache.get_cache_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert forecasting.get_latest_forecast(1, warehouse_id=1).tolist() == [1.0] * 14
+
+
+def test_new_sale_refits(fits):
+    inventory_manager.update_stock(1, 10, warehouse_id=1)
+    inventory_manager.adjust_stock_by_sale(1, 2, warehouse_id=1)
+
+    assert len(fits) == 2
+    assert forecast_cache.get_cache_stats()["misses"] == 2
+    assert forecasting.get_latest_forecast(1, warehouse_id=1).tolist() == [2.0] * 14
+
+
+def test_direct_save_invalidates_entry(fits):
+    inventory_manager.update_stock(1, 10, warehouse_id=1)
+    forecasting.save_forecast_to_db(1, pd.Series([0.5] * 14), "manual", warehouse_id=1)
+    forecasting.generate_forecast_for_product(1, warehouse_id=1)
+
+    assert len(fits) == 2
+
+
+def test_least_recently_used_entry_is_evicted(fits, monkeypatch):
+    monkeypatch.setattr(forecast_cache, "FORECAST_CACHE_MAX_ENTRIES", 1)
+    forecasting.generate_forecast_for_product(1, warehouse_id=1)
+    forecasting.generate_forecast_for_product(2, warehouse_id=1)
+
+    stats = forecast_cache.get_cache_stats()
+    assert (stats["size"], stats["evictions"]) == (1, 1)
+
+    # product 2 is still cached, product 1 was evicted and refits
+    forecasting.generate_forecast_for_product(2, warehouse_id=1)
+    assert len(fits) == 2
+    forecasting.generate_forecast_for_product(1, warehouse_id=1)
+    assert len(fits) == 3
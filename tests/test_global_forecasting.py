@@ -0,0 +1,123 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+pytest.importorskip("prophet")
+pytest.importorskip("pmdarima")
+
+from modules import forecast_cache, forecasting, inventory_manager
+from modules.preprocessing import get_daily_sales_by_partition, get_daily_sales_series
+
+
+@pytest.fixture
+def history(db, monkeypatch):
+    db.executescript("""
+        INSERT INTO warehouses (name) VALUES ('Sydney'), ('Toronto');
+        INSERT INTO products (name, category, price) VALUES ('cpu', 'CPU', 10.0), ('ram', 'RAM', 2.0);
+        INSERT INTO inventory VALUES (1, 1, 50, 'x'), (2, 1, 50, 'x'), (1, 2, 50, 'x'), (2, 2, 0, 'x');
+    """)
+    rng = np.random.default_rng(0)
+    for pid, wid in [(1, 1), (2, 1), (1, 2)]:
+        for day in range(90):
+            db.execute("""
+                INSERT INTO sales (product_id, warehouse_id, sale_qty, sale_date)
+                VALUES (?, ?, ?, datetime('now','localtime', ?))
+            """, (pid, wid, int(rng.poisson(2 + pid)) + 1, f"-{day} days"))
+    db.commit()
+    forecast_cache.reset_cache_stats()
+
+    def no_hybrid(series, days=14):
+        raise AssertionError("hybrid refit while global_gbm is selected")
+
+    monkeypatch.setattr(forecasting, "fit_hybrid", no_hybrid)
+    return db
+
+
+def _models(db):
+    return dict(db.execute("""
+        SELECT product_id || '/' || warehouse_id, MIN(model) FROM forecast_results
+        GROUP BY product_id, warehouse_id
+    """).fetchall())
+
+
+def test_partition_series_match_single_series(history):
+    by_partition = get_daily_sales_by_partition()
+    assert set(by_partition) == {(1, 1), (2, 1), (1, 2)}
+    pd.testing.assert_series_equal(by_partition[(1, 2)], get_daily_sales_series(1, 2), check_names=False)
+
+
+def test_whole_catalog_is_forecast_and_engine_is_remembered(history):
+    results = forecasting.generate_all_forecasts(engine="global_gbm")
+
+    assert forecasting.get_forecast_engine() == "global_gbm"
+    assert set(results) == {(1, 1), (2, 1), (1, 2), (2, 2)}
+    assert all(len(fc) == 14 and (fc >= 0).all() for fc in results.values())
+    assert _models(history) == {"1/1": "global_gbm", "2/1": "global_gbm", "1/2": "global_gbm", "2/2": "none"}
+
+
+def test_stock_correction_keeps_global_forecast(history):
+    forecasting.generate_all_forecasts(engine="global_gbm")
+    inventory_manager.update_stock(1, 1, warehouse_id=1)
+
+    assert forecast_cache.get_cache_stats()["hits"] == 1
+    assert _models(history)["1/1"] == "global_gbm"
+
+
+def test_sale_reforecasts_with_stored_model(history):
+    forecasting.generate_all_forecasts(engine="global_gbm")
+    inventory_manager.adjust_stock_by_sale(1, 3, warehouse_id=2)
+
+    assert forecast_cache.get_cache_stats()["misses"] == 1
+    assert _models(history)["1/2"] == "global_gbm"
+
+
+def test_failed_training_keeps_the_previous_engine(history, monkeypatch):
+    from modules import global_forecasting
+
+    def broken(X, y):
+        raise ValueError("training failed")
+
+    monkeypatch.setattr(global_forecasting, "train_global_model", broken)
+    with pytest.raises(ValueError):
+        forecasting.generate_all_forecasts(engine="global_gbm")
+
+    assert forecasting.get_forecast_engine() == "hybrid"
+    assert history.execute("SELECT COUNT(*) FROM forecast_models").fetchone()[0] == 0
+
+
+def test_missing_model_falls_back_to_hybrid_without_training(history, monkeypatch):
+    forecasting.set_forecast_engine("global_gbm")
+    monkeypatch.setattr(forecasting, "fit_hybrid", lambda series, days=14: (pd.Series([1.0] * days), "hybrid"))
+
+    inventory_manager.adjust_stock_by_sale(1, 3, warehouse_id=2)
+
+    assert _models(history) == {"1/2": "hybrid"}
+    assert history.execute("SELECT COUNT(*) FROM forecast_models").fetchone()[0] == 0
+
+
+def test_more_warehouses_than_categorical_bins_still_train():
+    from modules import global_forecasting
+
+    rng = np.random.default_rng(0)
+    n = 3000
+    X = pd.DataFrame({name: rng.random(n) for name in global_forecasting.FEATURES})
+    X["target_dow"] = rng.integers(0, 7, n)
+    X["target_month"] = rng.integers(0, 12, n)
+    X["category"] = rng.integers(0, 3, n)
+    X["warehouse"] = rng.integers(0, 300, n)
+    y = rng.poisson(2, n).astype(float)
+
+    model = global_forecasting.train_global_model(X, y)
+    assert (model.predict(X) >= 0).all()
+
+
+def test_panel_leaves_out_today(history):
+    from modules import global_forecasting
+
+    series = get_daily_sales_series(1, 1)
+    panel = global_forecasting.build_demand_panel({(1, 1): series}, [(1, 1)])
+    yesterday = pd.Timestamp.today().normalize() - pd.Timedelta(days=1)
+
+    assert panel.index[-1] == yesterday
+    assert panel[(1, 1)].iloc[-1] == series[yesterday]
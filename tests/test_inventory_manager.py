@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("prophet")
+pytest.importorskip("pmdarima")
+
+from modules import inventory_manager
+from modules.forecasting import generate_forecast_for_product
+
+
+@pytest.fixture
+def catalog(db):
+    db.executescript("""
+        INSERT INTO warehouses (name) VALUES ('Southlake Texas'), ('Sydney');
+        INSERT INTO products (name, category, price) VALUES ('cpu', 'CPU', 10.0);
+    """)
+    db.commit()
+    return db
+
+
+def test_stock_is_kept_per_warehouse_and_totalled(catalog):
+    assert inventory_manager.update_stock(1, 5, warehouse_id=1) == 5
+    assert inventory_manager.update_stock(1, 3, warehouse_id=2) == 3
+    assert inventory_manager.adjust_stock_by_sale(1, 2, warehouse_id=1) == 3
+
+    by_site = {r["warehouse_id"]: r["current_stock"] for r in inventory_manager.get_stock_by_location(1)}
+    assert by_site == {1: 3, 2: 3}
+    assert inventory_manager.get_all_products()[0]["current_stock"] == 6
+
+
+def test_rejected_write_leaves_stock_untouched(catalog):
+    inventory_manager.update_stock(1, 2, warehouse_id=1)
+    assert inventory_manager.adjust_stock_by_sale(1, 5, warehouse_id=1) == "NEGATIVE_STOCK_ERROR"
+    assert inventory_manager.update_stock(1, 9999, warehouse_id=1) == "MAX_STOCK_LIMIT"
+
+    assert inventory_manager.get_stock_by_location(1)[0]["current_stock"] == 2
+    assert catalog.execute("SELECT COUNT(*) FROM sales").fetchone()[0] == 0
+
+
+def test_forecasting_an_unstocked_product_creates_no_warehouse(catalog):
+    forecast = generate_forecast_for_product(1)
+    assert forecast.tolist() == [0.0] * 14
+    assert [w["name"] for w in inventory_manager.get_all_warehouses()] == ["Southlake Texas", "Sydney"]
+    assert catalog.execute("SELECT COUNT(*) FROM forecast_results").fetchone()[0] == 0